@@ -0,0 +1,145 @@
+# Pose model / LSTM detector backend selection, warmup and benchmarking
+import os
+import time
+import argparse
+import importlib.util
+import numpy as np
+
+# backend name -> (ultralytics export format, suffix appended to the model base path)
+BACKENDS = {
+    'tensorrt': ('engine', '.engine'),
+    'openvino': ('openvino', '_openvino_model'),
+    'onnx': ('onnx', '.onnx'),
+    'torch': (None, '.pt'),
+}
+AUTO_ORDER = ['tensorrt', 'openvino', 'onnx', 'torch']
+# The shipped TensorRT engine is built with a static batch of 1; the other formats
+# (exported with dynamic shapes below) take any batch size
+MAX_BATCH = {'tensorrt': 1}
+
+def available_backends():
+    found = []
+    for backend in AUTO_ORDER:
+        if backend == 'tensorrt':
+            if importlib.util.find_spec('tensorrt') is not None:
+                import torch
+                if torch.cuda.is_available():
+                    found.append(backend)
+        elif backend == 'torch' or importlib.util.find_spec(backend if backend != 'onnx' else 'onnxruntime') is not None:
+            found.append(backend)
+    return found
+
+def model_path_for(base, backend, int8=False):
+    suffix = BACKENDS[backend][1]
+    # ultralytics only quantizes OpenVINO exports (and names them <base>_int8_openvino_model)
+    if int8 and backend == 'openvino':
+        base = base + '_int8'
+    return base + suffix
+
+def pick_pose_backend(base='model/yolov8s-pose', backend='auto', int8=False, export=True):
+    # The backend resolve_pose_model will use, found without exporting anything or importing
+    # torch / ultralytics: the first candidate whose model exists or (with export) can be exported
+    candidates = available_backends() if backend == 'auto' else [backend]
+    for candidate in candidates:
+        if os.path.exists(model_path_for(base, candidate, int8)):
+            return candidate
+        if export and BACKENDS[candidate][0] not in (None, 'engine') and os.path.exists(base + '.pt'):
+            return candidate
+    raise FileNotFoundError(f"No usable pose model found for {base} (backend: {backend})")
+
+def resolve_pose_model(base='model/yolov8s-pose', backend='auto', int8=False, export=True, imgsz=640):
+    # Returns (path, backend). Missing CPU formats are exported once from <base>.pt.
+    backend = pick_pose_backend(base, backend, int8, export)
+    path = model_path_for(base, backend, int8)
+    if not os.path.exists(path):
+        from ultralytics import YOLO
+        path = str(YOLO(base + '.pt').export(format=BACKENDS[backend][0], int8=int8, imgsz=imgsz, dynamic=True))
+    return path, backend
+
+def set_num_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+        os.environ['OMP_NUM_THREADS'] = str(threads)
+
+def _apply_threads(model, path, backend, threads):
+    # ultralytics creates the ONNX Runtime / OpenVINO sessions with default thread
+    # pools, so rebuild them with an explicit intra-op thread count.
+    runtime = getattr(getattr(model, 'predictor', None), 'model', None)
+    if runtime is None or not threads:
+        return
+    if backend == 'onnx' and hasattr(runtime, 'session'):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        runtime.session = onnxruntime.InferenceSession(path, options, providers=runtime.session.get_providers())
+    elif backend == 'openvino' and hasattr(runtime, 'ov_compiled_model'):
+        import openvino
+        core = openvino.Core()
+        xml = next(f for f in os.listdir(path) if f.endswith('.xml'))
+        runtime.ov_compiled_model = core.compile_model(core.read_model(os.path.join(path, xml)), 'CPU',
+                                                       {'INFERENCE_NUM_THREADS': threads, 'PERFORMANCE_HINT': 'LATENCY'})
+
+def warmup(model, imgsz=640, runs=2):
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(frame, verbose=False)
+
+def load_pose_model(base='model/yolov8s-pose', backend='auto', int8=False, threads=None, imgsz=640, warmup_runs=2):
+    from ultralytics import YOLO
+    set_num_threads(threads)
+    path, backend = resolve_pose_model(base, backend, int8, imgsz=imgsz)
+    model = YOLO(path, task='pose')
+    # The first call builds the predictor; do it before the capture loop starts
+    warmup(model, imgsz, 1)
+    _apply_threads(model, path, backend, threads)
+    warmup(model, imgsz, max(warmup_runs - 1, 0))
+    return model, backend
+
+def load_detector(path, device='cpu', quantize=False):
+    import torch
+    from for_detect.Inference import LSTM
+    detector = LSTM(17*2, 8, 2, 3, device)
+    detector.load_state_dict(torch.load(path, map_location=device))
+    detector.eval()
+    if quantize and str(device) == 'cpu':
+        detector = torch.ao.quantization.quantize_dynamic(detector, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8)
+    with torch.inference_mode():
+        detector.lstm(torch.zeros(1, 1, 17*2, device=device))
+    return detector
+
+def benchmark(video_path, base='model/yolov8s-pose', backends=None, frames=200, threads=None, int8=False, imgsz=640):
+    import cv2
+    report = {}
+    for backend in backends or available_backends():
+        try:
+            model, backend = load_pose_model(base, backend, int8, threads, imgsz)
+        except Exception as e:
+            print(f"{backend}: skipped ({e})")
+            continue
+        cap = cv2.VideoCapture(video_path)
+        count = 0
+        start = time.perf_counter()
+        while count < frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            model(frame, imgsz=imgsz, verbose=False)
+            count += 1
+        elapsed = time.perf_counter() - start
+        cap.release()
+        report[backend] = count / elapsed if elapsed > 0 else 0.0
+        print(f"{backend}: {report[backend]:.1f} frames/sec over {count} frames")
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark pose model backends")
+    parser.add_argument('--video', default='video/pushup.mp4')
+    parser.add_argument('--model', default='model/yolov8s-pose', help='model path without extension')
+    parser.add_argument('--backends', nargs='*', choices=list(BACKENDS), default=None)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--int8', action='store_true')
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+    benchmark(args.video, args.model, args.backends, args.frames, args.threads, args.int8, args.imgsz)
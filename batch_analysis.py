@@ -0,0 +1,139 @@
+# Headless rep counting for recorded workout videos
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from backends import BACKENDS, MAX_BATCH, model_path_for, pick_pose_backend
+from counting import sport_list, CountingEngine, pose_keypoints, HYSTERESIS
+from keypoint_cache import KeypointCache, file_hash, DEFAULT_DIR
+
+def read_batches(cap, batch_size):
+    batch = []
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def extract_keypoints(video_path, model, batch_size=16, imgsz=640, device=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = []
+    try:
+        for batch in read_batches(cap, batch_size):
+            results = model(batch, imgsz=imgsz, device=device, verbose=False)
+            frames.extend(pose_keypoints(result) for result in results)
+    finally:
+        cap.release()
+    return frames, fps
+
+def count_reps(frames, fps, table=sport_list, hysteresis=HYSTERESIS):
+    engine = CountingEngine(table, hysteresis)
+    reps = []
+    for frame_idx, key_points in enumerate(frames):
+        if len(key_points):
+            for i in np.flatnonzero(engine.update(key_points[0])):
+                reps.append({"exercise": engine.names[i], "frame": frame_idx, "time": round(frame_idx / fps, 3)})
+    return engine.counts(), reps
+
+def apply_thresholds(thresholds, table=sport_list):
+    # thresholds: ["squat=80:140", ...] -> copy of the table with maintaining/relaxing overridden
+    table = {name: dict(sport) for name, sport in table.items()}
+    for threshold in thresholds or []:
+        name, values = threshold.split("=")
+        maintaining, relaxing = values.split(":")
+        table[name]['maintaining'] = float(maintaining)
+        table[name]['relaxing'] = float(relaxing)
+    return table
+
+def analyze_video(video_path, get_model, batch_size=16, hysteresis=HYSTERESIS, imgsz=640, device=None,
+                  table=sport_list, cache=None, cache_tag=None):
+    # get_model() returns the pose model; it is only called on a cache miss
+    start = time.perf_counter()
+    cached = None
+    if cache is not None:
+        video_hash = file_hash(video_path)
+        cached = cache.load(video_hash, cache_tag)
+    if cached is not None:
+        frames, fps = cached
+    else:
+        frames, fps = extract_keypoints(video_path, get_model(), batch_size, imgsz, device)
+        if cache is not None:
+            cache.save(video_hash, cache_tag, frames, fps)
+    totals, reps = count_reps(frames, fps, table, hysteresis)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "video": os.path.abspath(video_path),
+        "fps": fps,
+        "frames": len(frames),
+        "duration": round(len(frames) / fps, 3),
+        "elapsed": round(elapsed, 3),
+        "realtime_factor": round(len(frames) / fps / elapsed, 2) if elapsed > 0 else None,
+        "from_cache": cached is not None,
+        "hysteresis": hysteresis,
+        "thresholds": {name: [sport['maintaining'], sport['relaxing']] for name, sport in table.items()},
+        "totals": totals,
+        "reps": reps,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in recorded videos without a display")
+    parser.add_argument('videos', nargs='+', help='video files to analyze')
+    parser.add_argument('--model', default='model/yolov8s-pose', help='pose model path without extension')
+    parser.add_argument('--backend', choices=['auto'] + list(BACKENDS), default='auto', help='pose model runtime')
+    parser.add_argument('--int8', action='store_true', help='use an int8-quantized model where the backend supports it')
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads for CPU inference')
+    parser.add_argument('--batch-size', type=int, default=16, help='frames per pose model call')
+    parser.add_argument('--imgsz', type=int, default=640, help='inference image size')
+    parser.add_argument('--device', default='cpu', help='inference device')
+    parser.add_argument('--hysteresis', type=float, default=HYSTERESIS)
+    parser.add_argument('--threshold', action='append', metavar='EXERCISE=MAINTAINING:RELAXING',
+                        help='override an exercise threshold, e.g. squat=80:140 (repeatable)')
+    parser.add_argument('--cache-dir', default=DEFAULT_DIR, help='keypoint cache directory')
+    parser.add_argument('--no-cache', action='store_true', help='always run pose inference')
+    parser.add_argument('--output-dir', default=None, help='where to write <video>.reps.json (default: next to the video)')
+    args = parser.parse_args()
+
+    # Keypoints differ slightly between runtimes and precisions, so each one gets its own cache entries.
+    # The backend is picked without loading (or exporting) the model, so cache hits need neither torch nor ultralytics.
+    backend = pick_pose_backend(args.model, args.backend, args.int8)
+    int8 = args.int8 and model_path_for(args.model, backend, True) != model_path_for(args.model, backend)
+    cache_tag = f"{os.path.basename(args.model)}-{backend}-{'int8' if int8 else 'fp32'}-{args.imgsz}"
+    batch_size = min(args.batch_size, MAX_BATCH.get(backend, args.batch_size))
+
+    loaded = []
+    def get_model():
+        if not loaded:
+            from backends import load_pose_model
+            model, _ = load_pose_model(args.model, backend, args.int8, args.threads, args.imgsz)
+            print("Pose model backend:", backend)
+            loaded.append(model)
+        return loaded[0]
+
+    table = apply_thresholds(args.threshold)
+    cache = None if args.no_cache else KeypointCache(args.cache_dir)
+    if cache is not None:
+        print("Keypoint cache tag:", cache_tag)
+    for video_path in args.videos:
+        report = analyze_video(video_path, get_model, batch_size, args.hysteresis, args.imgsz, args.device,
+                               table, cache, cache_tag)
+        output_dir = args.output_dir or os.path.dirname(os.path.abspath(video_path))
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(video_path))[0] + '.reps.json')
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        source = "cached keypoints" if report['from_cache'] else "pose inference"
+        print(f"{video_path}: {report['totals']} ({report['realtime_factor']}x real-time from {source}) -> {output_path}")
+
+if __name__ == '__main__':
+    main()
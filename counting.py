@@ -0,0 +1,132 @@
+import numpy as np
+
+sport_list = {
+    'situp': {
+        'label': 'Sit-ups',
+        'left_points_idx': [6, 12, 14],
+        'right_points_idx': [5, 11, 13],
+        'maintaining': 70,
+        'relaxing': 110,
+        'concerned_key_points_idx': [5, 6, 11, 12, 13, 14],
+        'concerned_skeletons_idx': [[14, 12], [15, 13], [6, 12], [7, 13]]
+    },
+    'pushup': {
+        'label': 'Push-ups',
+        'left_points_idx': [6, 8, 10],
+        'right_points_idx': [5, 7, 9],
+        'maintaining': 140,
+        'relaxing': 120,
+        'concerned_key_points_idx': [5, 6, 7, 8, 9, 10],
+        'concerned_skeletons_idx': [[9, 11], [7, 9], [6, 8], [8, 10]]
+    },
+    'squat': {
+        'label': 'Squats',
+        'left_points_idx': [11, 13, 15],
+        'right_points_idx': [12, 14, 16],
+        'maintaining': 80,
+        'relaxing': 140,
+        'concerned_key_points_idx': [11, 12, 13, 14, 15, 16],
+        'concerned_skeletons_idx': [[16, 14], [14, 12], [17, 15], [15, 13]]
+    }
+}
+
+HYSTERESIS = 48.7
+
+def build_points_idx(table=sport_list):
+    # (exercises, sides, 3) joint indices; the middle joint is the angle vertex
+    return np.array([[sport['left_points_idx'], sport['right_points_idx']] for sport in table.values()], dtype=np.intp)
+
+def joint_angles(key_points, points_idx):
+    # key_points: (..., 17, 2+) array -> (..., exercises) mean left/right joint angle in degrees
+    points = np.asarray(key_points, dtype=np.float32)[..., points_idx, :2]
+    vertex = points[..., 1, :]
+    end1 = points[..., 0, :] - vertex
+    end2 = points[..., 2, :] - vertex
+    diff = np.abs(np.degrees(np.arctan2(end1[..., 1], end1[..., 0]) - np.arctan2(end2[..., 1], end2[..., 0])))
+    diff = np.where(diff > 180, 360 - diff, diff)
+    return diff.mean(axis=-1)
+
+def pose_keypoints(result):
+    # (people, 17, 2) numpy keypoints from an ultralytics pose result; ultralytics
+    # reports an empty (1, 0, 2) array when nobody is detected
+    if result.keypoints is None or result.keypoints.shape[1] == 0:
+        return np.zeros((0, 17, 2), dtype=np.float32)
+    return result.keypoints.xy.cpu().numpy()
+
+class CounterState:
+    fields = ('reaching', 'reaching_last', 'state_keep', 'prev_angle', 'count')
+
+    def __init__(self, shape):
+        self.reaching = np.zeros(shape, dtype=bool)
+        self.reaching_last = np.zeros(shape, dtype=bool)
+        self.state_keep = np.zeros(shape, dtype=bool)
+        self.prev_angle = np.full(shape, np.nan, dtype=np.float32)
+        self.count = np.zeros(shape, dtype=np.int64)
+
+    def take(self, rows):
+        state = CounterState.__new__(CounterState)
+        for field in self.fields:
+            setattr(state, field, getattr(self, field)[rows])
+        return state
+
+    def append(self, n):
+        fresh = CounterState((n,) + self.count.shape[1:])
+        for field in self.fields:
+            setattr(self, field, np.concatenate([getattr(self, field), getattr(fresh, field)]))
+
+def step_counters(state, angles, maintaining, relaxing, hysteresis, active=None):
+    # Advances every hysteresis state machine in `state` by one frame and returns
+    # a bool array of the counters that completed a rep on this frame. Thresholds
+    # broadcast against `angles`, so one call can also evaluate many settings.
+    maintained = angles < maintaining - hysteresis
+    if active is not None:
+        maintained &= active
+    # "maintained" wins when both thresholds are crossed (overlapping settings), as in the original if / elif
+    relaxed = (angles > relaxing + hysteresis) & ~maintained
+    if active is not None:
+        relaxed &= active
+    reaching = maintained | (state.reaching & ~relaxed)
+    changed = reaching != state.reaching_last
+    counted = changed & ~reaching & state.state_keep & (state.prev_angle > relaxing)
+
+    state.reaching = reaching
+    state.reaching_last = reaching
+    state.state_keep = np.where(changed, reaching, state.state_keep)
+    if active is None:
+        state.prev_angle = np.asarray(angles, dtype=np.float32)
+    else:
+        state.prev_angle = np.where(active, angles, state.prev_angle).astype(np.float32)
+    state.count += counted
+    return counted, maintained, relaxed
+
+class CountingEngine:
+    def __init__(self, table=sport_list, hysteresis=HYSTERESIS):
+        self.names = list(table)
+        self.labels = [sport.get('label', name) for name, sport in table.items()]
+        self.points_idx = build_points_idx(table)
+        self.maintaining = np.array([sport['maintaining'] for sport in table.values()], dtype=np.float32)
+        self.relaxing = np.array([sport['relaxing'] for sport in table.values()], dtype=np.float32)
+        self.hysteresis = hysteresis
+        self.reset()
+
+    def reset(self):
+        self.state = CounterState(len(self.names))
+        self.maintained = np.zeros(len(self.names), dtype=bool)
+        self.relaxed = np.zeros(len(self.names), dtype=bool)
+
+    def angles(self, key_points, active=None):
+        if active is None:
+            return joint_angles(key_points, self.points_idx)
+        angles = np.full(len(self.names), np.nan, dtype=np.float32)
+        angles[active] = joint_angles(key_points, self.points_idx[active])
+        return angles
+
+    def step(self, angles, active=None):
+        counted, self.maintained, self.relaxed = step_counters(self.state, angles, self.maintaining, self.relaxing, self.hysteresis, active)
+        return counted
+
+    def update(self, key_points, active=None):
+        return self.step(self.angles(key_points, active), active)
+
+    def counts(self):
+        return dict(zip(self.names, self.state.count.tolist()))
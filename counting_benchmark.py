@@ -0,0 +1,243 @@
+# Headless replay benchmark and regression check for the rep counting path
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from counting import sport_list, CountingEngine, CounterState, build_points_idx, joint_angles, step_counters, HYSTERESIS
+from tracking import PoseTracker
+from for_detect.sequences import read_keypoint_csv
+
+DEFAULT_BASELINE = "counting_benchmark.json"
+# (maintaining, relaxing, hysteresis) settings checked against the original counter logic;
+# the last two overlap (maintaining - h > relaxing + h), where "maintained" must win
+REFERENCE_SETTINGS = [(sport['maintaining'], sport['relaxing'], HYSTERESIS) for sport in sport_list.values()] + [(170, 60, 0.0), (120, 90, 10.0)]
+
+def _base_pose(rng):
+    # A rough standing skeleton in pixel coordinates, jittered per sequence
+    pose = np.array([[320, 80], [330, 70], [310, 70], [340, 75], [300, 75], [370, 140], [270, 140], [390, 220], [250, 220],
+                     [400, 300], [240, 300], [350, 300], [290, 300], [355, 410], [285, 410], [360, 520], [280, 520]], dtype=np.float32)
+    return pose + rng.normal(0, 3, pose.shape).astype(np.float32)
+
+def _set_angle(pose, points_idx, angles):
+    # Rotates the last joint of each (first, vertex, last) triple about the vertex so the
+    # joint angle equals `angles` (frames,) while the first joint and vertex stay put.
+    first, vertex, last = points_idx
+    arm = pose[first] - pose[vertex]
+    arm = arm / np.linalg.norm(arm)
+    length = np.linalg.norm(pose[last] - pose[vertex])
+    theta = np.radians(angles)
+    rotated = np.stack([arm[0] * np.cos(theta) - arm[1] * np.sin(theta), arm[0] * np.sin(theta) + arm[1] * np.cos(theta)], axis=-1)
+    return pose[vertex] + length * rotated
+
+def synthetic_range(exercise, hysteresis=HYSTERESIS):
+    # (low, high) joint angle of the synthetic swing, kept inside what a joint can show
+    sport = sport_list[exercise]
+    return max(sport['maintaining'] - hysteresis - 10, 5), min(sport['relaxing'] + hysteresis + 8, 178)
+
+def synthetic_reachable(exercise, hysteresis=HYSTERESIS):
+    # False when the clamped swing cannot cross both thresholds, so it can never count a rep
+    sport = sport_list[exercise]
+    low, high = synthetic_range(exercise, hysteresis)
+    return low < sport['maintaining'] - hysteresis and high > sport['relaxing'] + hysteresis
+
+def synthetic_sequence(exercise, reps, frames_per_rep=40, noise=1.0, seed=0, hysteresis=HYSTERESIS):
+    # (frames, 17, 2) sequence of `reps` clean repetitions of one exercise: the joint angle
+    # swings from just past the relaxing threshold to just past the maintaining threshold and back
+    rng = np.random.default_rng(seed)
+    sport = sport_list[exercise]
+    low, high = synthetic_range(exercise, hysteresis)
+    phase = np.arange(reps * frames_per_rep + frames_per_rep // 2) / frames_per_rep
+    angles = np.where(phase < reps, low + (high - low) * (1 + np.cos(2 * np.pi * phase)) / 2, high)
+
+    pose = _base_pose(rng)
+    frames = np.repeat(pose[None], len(angles), axis=0)
+    for side in ('left_points_idx', 'right_points_idx'):
+        frames[:, sport[side][2]] = _set_angle(pose, sport[side], angles)
+    return frames + rng.normal(0, noise, frames.shape).astype(np.float32)
+
+def load_cases(data_dir="for_detect/data", labels=None, synthetic_reps=200, seed=0):
+    # [(name, key_points, exercise, expected reps or None)]
+    labels = labels or {}
+    cases = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*", "*.csv"))):
+        key = os.path.relpath(path).replace(os.sep, "/")
+        label = labels.get(key, {})
+        exercise = label.get("exercise", os.path.basename(os.path.dirname(path)))
+        cases.append((key, read_keypoint_csv(path), exercise, label.get("reps")))
+    if synthetic_reps:
+        for i, exercise in enumerate(sport_list):
+            # Unreachable settings still replay (fps and counts are compared) but get no expected count
+            expected = synthetic_reps
+            if not synthetic_reachable(exercise):
+                sport = sport_list[exercise]
+                low, high = synthetic_range(exercise)
+                print(f"WARNING synthetic/{exercise}: the thresholds (maintaining - hysteresis {sport['maintaining'] - HYSTERESIS:g}, "
+                      f"relaxing + hysteresis {sport['relaxing'] + HYSTERESIS:g}) are not both inside the synthetic swing "
+                      f"{low:g}-{high:g} degrees, so it cannot count reps; accuracy is not reported")
+                expected = None
+            cases.append((f"synthetic/{exercise}", synthetic_sequence(exercise, synthetic_reps, seed=seed + i), exercise, expected))
+    return cases
+
+def _replay(key_points, repeat):
+    times, counts = [], None
+    for _ in range(repeat):
+        engine = CountingEngine(sport_list, HYSTERESIS)
+        start = time.perf_counter()
+        for frame in key_points:
+            engine.update(frame)
+        times.append(time.perf_counter() - start)
+        counts = engine.counts()
+    return float(np.median(times)), counts
+
+def _replay_tracked(key_points, repeat, people=3):
+    # The same sequence performed side by side by several people, through the multi-person tracker
+    offsets = np.arange(people, dtype=np.float32)[:, None, None] * np.array([600, 0], dtype=np.float32)
+    crowd = key_points[:, None] + offsets
+    times, counts = [], None
+    for _ in range(repeat):
+        tracker = PoseTracker(sport_list, HYSTERESIS)
+        start = time.perf_counter()
+        for frame in crowd:
+            tracker.update(frame)
+        times.append(time.perf_counter() - start)
+        counts = tracker.counts()
+    return float(np.median(times)), counts
+
+def run(cases, repeat=5, tracked=True):
+    results = {}
+    for name, key_points, exercise, expected in cases:
+        seconds, counts = _replay(key_points, repeat)
+        result = {"frames": len(key_points), "fps": len(key_points) / seconds, "exercise": exercise, "counts": counts, "expected": expected}
+        if expected is not None:
+            result["accuracy"] = 1 - min(abs(counts[exercise] - expected) / max(expected, 1), 1)
+        results[name] = result
+        if tracked and name.startswith("synthetic/"):
+            seconds, counts = _replay_tracked(key_points, repeat)
+            results[name + "/tracked"] = {"frames": len(key_points), "fps": len(key_points) / seconds, "exercise": exercise, "counts": counts, "expected": None}
+    return results
+
+def reference_count(angles, maintaining, relaxing, hysteresis):
+    # The original per-exercise if / elif state machine, one frame at a time
+    reaching = reaching_last = state_keep = False
+    prev_angle = None
+    count = 0
+    for angle in angles:
+        if angle < maintaining - hysteresis:
+            reaching = True
+        elif angle > relaxing + hysteresis:
+            reaching = False
+        if reaching != reaching_last:
+            reaching_last = reaching
+            if reaching:
+                state_keep = True
+            elif state_keep:
+                if prev_angle is not None and prev_angle > relaxing:
+                    count += 1
+                state_keep = False
+        prev_angle = angle
+    return count
+
+def check_reference(cases, reps=20, seed=0):
+    # step_counters must count exactly like reference_count for every angle sequence and setting
+    rng = np.random.default_rng(seed)
+    phase = np.arange(reps * 40) / 40
+    sequences = {"swing": 10 + 84 * (1 + np.cos(2 * np.pi * phase)) + rng.normal(0, 2, len(phase))}
+    points_idx = build_points_idx()
+    for name, key_points, _, _ in cases:
+        for exercise, angles in zip(sport_list, joint_angles(key_points, points_idx).T):
+            sequences[f"{name}/{exercise}"] = angles
+    maintaining, relaxing, hysteresis = (np.array(values, dtype=np.float32) for values in zip(*REFERENCE_SETTINGS))
+
+    failures = []
+    for name, angles in sequences.items():
+        angles = np.asarray(angles, dtype=np.float32)
+        state = CounterState(len(REFERENCE_SETTINGS))
+        for angle in angles:
+            step_counters(state, angle, maintaining, relaxing, hysteresis)
+        for setting, count in zip(REFERENCE_SETTINGS, state.count.tolist()):
+            expected = reference_count(angles.tolist(), *(np.float32(value) for value in setting))
+            if count != expected:
+                failures.append(f"{name}: step_counters counted {count}, the original logic {expected} with (maintaining, relaxing, hysteresis) {setting}")
+    return failures
+
+def compare(results, baseline, tolerance):
+    # Returns (regressions, slower sequences) against a previous run, as human-readable lines.
+    # Counts must match for every sequence. Per-sequence fps is too noisy to fail on (a 10 ms
+    # replay swings by more than 20%), so only the aggregate fps (all frames of the sequences
+    # both runs have in common over their total replay time) is gated.
+    failures, slower = [], []
+    frames = seconds = reference_frames = reference_seconds = 0.0
+    for name, reference in baseline.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if result["counts"] != reference["counts"]:
+            failures.append(f"{name}: counts {result['counts']} differ from the baseline {reference['counts']}")
+        frames += result["frames"]
+        seconds += result["frames"] / result["fps"]
+        reference_frames += reference["frames"]
+        reference_seconds += reference["frames"] / reference["fps"]
+        if result["fps"] < reference["fps"] * (1 - tolerance):
+            slower.append(f"{name}: {result['fps']:.0f} fps is more than {tolerance:.0%} below the baseline {reference['fps']:.0f} fps")
+    if seconds and frames / seconds < reference_frames / reference_seconds * (1 - tolerance):
+        failures.append(f"aggregate: {frames / seconds:.0f} fps is more than {tolerance:.0%} below the baseline {reference_frames / reference_seconds:.0f} fps")
+    return failures, slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded and synthetic keypoint sequences through the rep counters (no camera, model or display)")
+    parser.add_argument('--data-dir', default='for_detect/data')
+    parser.add_argument('--labels', default=None, help='optional JSON with true rep counts: {"for_detect/data/squat/001.csv": {"exercise": "squat", "reps": 12}}')
+    parser.add_argument('--synthetic-reps', type=int, default=200, help='repetitions per synthetic sequence (0 to skip)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per sequence; the median is reported')
+    parser.add_argument('--no-tracker', action='store_true', help='skip the multi-person tracker replay')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional drop of the aggregate fps before failing')
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the new baseline')
+    args = parser.parse_args()
+
+    labels = None
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+    cases = load_cases(args.data_dir, labels, args.synthetic_reps, args.seed)
+    results = run(cases, args.repeat, not args.no_tracker)
+
+    for name, result in results.items():
+        line = f"{name}: {result['frames']} frames, {result['fps']:.0f} fps, {result['exercise']} {result['counts'][result['exercise']]}"
+        if result["expected"] is not None:
+            line += f"/{result['expected']} (accuracy {result['accuracy']:.0%})"
+        others = {exercise: count for exercise, count in result["counts"].items() if exercise != result["exercise"] and count}
+        if others:
+            line += f", other counters {others}"
+        print(line)
+
+    mismatches = check_reference(cases, seed=args.seed)
+    for mismatch in mismatches:
+        print("MISMATCH", mismatch)
+    if mismatches:
+        return 1
+    print(f"Counters match the original logic on {len(REFERENCE_SETTINGS)} threshold settings")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        failures, slower = compare(results, json.load(f), args.tolerance)
+    for line in slower:
+        print("SLOWER", line)
+    for failure in failures:
+        print("REGRESSION", failure)
+    if failures:
+        return 1
+    print(f"No regressions against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Long-lived detection process for the dashboard: models are loaded and warmed once,
+# sessions are started over a command queue and their results come back on a result queue
+import os
+import sys
+import queue
+import importlib.util
+import multiprocessing
+import traceback
+
+SCRIPT_NAME = "test object detection.py"
+RUN = "run"
+STOP = "stop"
+
+def load_detection_script(path=SCRIPT_NAME):
+    # The detection script's file name has spaces, so it is imported by path
+    spec = importlib.util.spec_from_file_location("detection_session", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _worker_main(script_path, argv, commands, results):
+    try:
+        detection = load_detection_script(script_path)
+        args = detection.parse_args(argv)
+        models = detection.load_models(args)
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+        # a worker without models is of no use; the non-zero exit marks it as crashed
+        sys.exit(1)
+    results.put(("ready", models["backend"]))
+
+    while True:
+        command = commands.get()
+        if command == STOP:
+            break
+        results.put(("started", None))
+        try:
+            results.put(("finished", detection.run_session(args, models)))
+        except Exception:
+            results.put(("error", traceback.format_exc()))
+
+class DetectionWorker:
+    # cv2 windows need a main thread of their own, and tkinter already owns the
+    # dashboard's, so detection runs in a separate (spawned) process.
+    def __init__(self, argv=(), script_path=None):
+        context = multiprocessing.get_context("spawn")
+        self.commands = context.Queue()
+        self.results = context.Queue()
+        script_path = script_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), SCRIPT_NAME)
+        self.process = context.Process(target=_worker_main, args=(script_path, list(argv), self.commands, self.results),
+                                       name="detection", daemon=True)
+        self.ready = False
+        self.busy = False
+        self.crashed = False
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def run_session(self):
+        # Queued until the models are ready if the worker is still loading
+        self.busy = True
+        self.commands.put(RUN)
+
+    def poll(self):
+        # Non-blocking; returns the (kind, payload) messages received since the last call
+        messages = []
+        while True:
+            try:
+                kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "ready":
+                self.ready = True
+            elif kind == "error" and not self.ready:
+                # the models failed to load, so no session can ever run
+                self.crashed = True
+                self.busy = False
+            elif kind in ("finished", "error"):
+                self.busy = False
+            messages.append((kind, payload))
+        # The worker only exits on its own when it failed (it outlives every session until stop())
+        if not messages and not self.crashed and self.process.exitcode is not None:
+            self.crashed = True
+            self.busy = False
+            messages.append(("error", f"Detection worker exited with code {self.process.exitcode}"))
+        return messages
+
+    def stop(self, timeout=2.0):
+        if self.process.is_alive():
+            self.commands.put(STOP)
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -1,28 +1,24 @@
 # When test object detection.py is ended by pressing the exit key
 import tkinter as tk
 from tkinter import messagebox
+from session_store import open_store, LOG_COLUMNS
 
-def show_latest_exercise_counts():
-    try:
-        with open("exercise_count.txt", "r") as file:
-            lines = file.readlines()
-            if lines:
-                latest_counts = lines[-2:]
-                formatted_counts = ""
-                
-                for count in latest_counts:
-                    date_time, exercise_details = count.split(',', 1)
-                    formatted_counts += f"{date_time.strip()}\n"
-                    exercises = exercise_details.split(',')
-                    for exercise in exercises:
-                        formatted_counts += f"{exercise.strip()}\n"
-                    formatted_counts += "\n"
+def format_sessions(sessions):
+    formatted_counts = ""
+    for recorded_at, counts in sessions:
+        formatted_counts += f"{recorded_at.strftime('%A %m/%d/%y %I:%M %p')}\n"
+        for column, name in LOG_COLUMNS.items():
+            formatted_counts += f"{counts.get(name, 0)} {column}\n"
+        formatted_counts += "\n"
+    return formatted_counts.strip()
 
-                messagebox.showinfo("Latest Exercise Counts", formatted_counts.strip())
-            else:
-                messagebox.showinfo("Exercise Progress", "No exercise data found. Time to hit the floor!")
-    except FileNotFoundError:
-        messagebox.showerror("Error", "Oops! No exercise data found. Start counting now!")
+def show_latest_exercise_counts():
+    with open_store() as store:
+        latest_sessions = store.latest_sessions(2)
+    if latest_sessions:
+        messagebox.showinfo("Latest Exercise Counts", format_sessions(latest_sessions))
+    else:
+        messagebox.showinfo("Exercise Progress", "No exercise data found. Time to hit the floor!")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,133 @@
+# Memory-mapped keypoint sequence dataset for training / evaluating the LSTM detector
+import os
+import json
+import glob
+import argparse
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+from for_detect.sequences import read_keypoint_csv
+
+FRAMES_FILE = 'frames.f32'
+INDEX_FILE = 'index.npz'
+
+def convert(data_dir='for_detect/data', out_dir='for_detect/dataset', category_path='for_detect/checkpoint/idx_2_category.json'):
+    # Writes every <data_dir>/<category>/*.csv sequence back to back into one float32
+    # (frames, 17, 2) file plus an index of sequence offsets, lengths and labels.
+    with open(category_path, 'r') as f:
+        idx_2_category = json.load(f)
+    category_2_idx = {category: int(idx) for idx, category in idx_2_category.items()}
+    os.makedirs(out_dir, exist_ok=True)
+
+    offsets, lengths, labels, sources = [], [], [], []
+    offset = 0
+    with open(os.path.join(out_dir, FRAMES_FILE), 'wb') as frames_file:
+        for category, label in sorted(category_2_idx.items(), key=lambda item: item[1]):
+            for path in sorted(glob.glob(os.path.join(data_dir, category, '*.csv'))):
+                frames = read_keypoint_csv(path)
+                frames_file.write(np.ascontiguousarray(frames, dtype=np.float32).tobytes())
+                offsets.append(offset)
+                lengths.append(len(frames))
+                labels.append(label)
+                sources.append(os.path.relpath(path, data_dir))
+                offset += len(frames)
+    np.savez(os.path.join(out_dir, INDEX_FILE), offsets=np.array(offsets, dtype=np.int64), lengths=np.array(lengths, dtype=np.int64),
+             labels=np.array(labels, dtype=np.int64), sources=np.array(sources), total_frames=np.int64(offset))
+    return len(offsets), offset
+
+class KeypointWindowDataset(Dataset):
+    # Fixed-length windows over the converted sequences. Frames stay in the memory-mapped
+    # file and only the frames of the requested window are copied out per item. Only the
+    # path is pickled (DataLoader workers are spawned on Windows); each process maps the
+    # file itself on first use instead of receiving a copy of every frame.
+    def __init__(self, dataset_dir='for_detect/dataset', window=5, stride=1):
+        with np.load(os.path.join(dataset_dir, INDEX_FILE)) as index:
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.labels = index['labels']
+            self.total_frames = int(index['total_frames'])
+        self.frames_path = os.path.join(dataset_dir, FRAMES_FILE)
+        self._frames = None
+        self.window = window
+
+        # windows per sequence; sequences shorter than the window give one padded window
+        counts = np.maximum((self.lengths - window) // stride + 1, 1)
+        sequence = np.repeat(np.arange(len(self.lengths)), counts)
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.starts = self.offsets[sequence] + position * stride
+        self.sizes = np.minimum(self.lengths[sequence], window)
+        self.window_labels = self.labels[sequence]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_frames'] = None
+        return state
+
+    @property
+    def frames(self):
+        if self._frames is None:
+            self._frames = np.memmap(self.frames_path, dtype=np.float32, mode='r', shape=(self.total_frames, 17, 2))
+        return self._frames
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        start, size = self.starts[i], self.sizes[i]
+        frames = torch.from_numpy(np.array(self.frames[start:start + size]).reshape(size, 17 * 2))
+        return frames, int(self.window_labels[i])
+
+def collate_windows(batch):
+    # Left-pads to the longest window so the last time step (the one the classifier
+    # reads) is always a real frame. Returns (batch, time, 34) inputs, lengths, labels.
+    lengths = torch.tensor([len(frames) for frames, _ in batch])
+    inputs = torch.zeros(len(batch), int(lengths.max()), 17 * 2)
+    for i, (frames, _) in enumerate(batch):
+        inputs[i, inputs.shape[1] - len(frames):] = frames
+    labels = torch.tensor([label for _, label in batch])
+    return inputs, lengths, labels
+
+def make_loader(dataset_dir='for_detect/dataset', window=5, stride=1, batch_size=64, shuffle=False, num_workers=0):
+    dataset = KeypointWindowDataset(dataset_dir, window, stride)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers, collate_fn=collate_windows)
+
+def train_epoch(model, loader, optimizer, device='cpu'):
+    model.train()
+    criterion = torch.nn.CrossEntropyLoss()
+    total_loss = 0.0
+    for inputs, _, labels in loader:
+        inputs, labels = inputs.to(device), labels.to(device)
+        optimizer.zero_grad()
+        loss = criterion(model(inputs), labels)
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * len(labels)
+    return total_loss / max(len(loader.dataset), 1)
+
+@torch.inference_mode()
+def evaluate(model, loader, device='cpu'):
+    model.eval()
+    correct = 0
+    for inputs, _, labels in loader:
+        predictions = model(inputs.to(device)).argmax(dim=-1).cpu()
+        correct += int((predictions == labels).sum())
+    return correct / max(len(loader.dataset), 1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert keypoint CSVs to the memory-mapped dataset format or evaluate the detector on it")
+    parser.add_argument('command', choices=['convert', 'evaluate'])
+    parser.add_argument('--data-dir', default='for_detect/data')
+    parser.add_argument('--dataset-dir', default='for_detect/dataset')
+    parser.add_argument('--checkpoint', default='for_detect/checkpoint/best_model.pt')
+    parser.add_argument('--window', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        sequences, frames = convert(args.data_dir, args.dataset_dir, os.path.join(os.path.dirname(args.checkpoint), 'idx_2_category.json'))
+        print(f"Wrote {sequences} sequences ({frames} frames) to {args.dataset_dir}")
+    else:
+        from backends import load_detector
+        detector = load_detector(args.checkpoint)
+        accuracy = evaluate(detector, make_loader(args.dataset_dir, args.window, batch_size=args.batch_size))
+        print(f"Window accuracy: {accuracy:.3f}")
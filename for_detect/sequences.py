@@ -0,0 +1,14 @@
+# Readers for the recorded keypoint sequences under for_detect/data
+import csv
+import json
+import numpy as np
+
+def read_keypoint_csv(path):
+    # Each row holds a sliding window of consecutive frames (stride 1), every cell a
+    # stringified list of 17 [x, y] points. Returns the (frames, 17, 2) float32 sequence.
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return np.zeros((0, 17, 2), dtype=np.float32)
+    cells = rows[0] + [row[-1] for row in rows[1:]]
+    return np.array([json.loads(cell) for cell in cells], dtype=np.float32)
@@ -0,0 +1,95 @@
+# Frame-by-frame exercise classification with the LSTM detector
+import numpy as np
+import torch
+
+TRAINING_WINDOW = 5
+
+class StreamingClassifier:
+    # Instead of re-running the LSTM over a whole window every frame, each new frame
+    # is fed once while the hidden state is carried over. The detector was trained on
+    # 5-frame windows, so every prediction is made from a state that has seen exactly
+    # the last `window` frames: after a prediction the state is reset and re-primed
+    # with the frames the next window shares with this one (none when every >= window).
+    def __init__(self, model, idx_2_category, window=TRAINING_WINDOW, every=5, device=None):
+        self.model = model.eval()
+        self.idx_2_category = {int(k): v for k, v in idx_2_category.items()}
+        self.window = window
+        self.every = every
+        self.device = device if device is not None else next(model.parameters()).device
+        self.buffer = np.zeros((window, 17 * 2), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.position = 0
+        self.filled = 0
+        self.frames = 0
+        self.hidden = None
+        self.output = None
+        self.steps = 0
+        self.prediction = None
+        self.probabilities = None
+
+    def _step(self, features):
+        x = torch.from_numpy(features).to(self.device).view(1, 1, -1)
+        self.output, self.hidden = self.model.lstm(x, self.hidden)
+        self.steps += 1
+
+    def _recent(self, n):
+        idx = (self.position - n + np.arange(n)) % self.window
+        return self.buffer[idx]
+
+    @torch.inference_mode()
+    def push(self, key_points):
+        features = np.asarray(key_points, dtype=np.float32)[:, :2].reshape(-1)
+        self.buffer[self.position] = features
+        self.position = (self.position + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+        self.frames += 1
+
+        # frames until the next prediction; only the last `window` of them are fed
+        due_in = -self.frames % self.every
+        if due_in < self.window:
+            self._step(features)
+        if due_in == 0:
+            if self.steps == self.window:
+                logits = self.model.fc(self.output[:, -1, :])
+                self.probabilities = torch.softmax(logits, dim=-1)[0].cpu().numpy()
+                self.prediction = self.idx_2_category[int(self.probabilities.argmax())]
+            self.hidden = None
+            self.steps = 0
+            for recent in self._recent(min(max(self.window - self.every, 0), self.filled)):
+                self._step(recent)
+        return self.prediction
+
+    def active_mask(self, names):
+        # Until the first prediction every counter stays active
+        if self.prediction is None:
+            return np.ones(len(names), dtype=bool)
+        return np.array([name == self.prediction for name in names], dtype=bool)
+
+class TrackClassifiers:
+    # One streaming classifier per tracked person, so each LSTM only ever sees one
+    # person's frames and each track's counters are gated by its own prediction
+    def __init__(self, model, idx_2_category, window=TRAINING_WINDOW, every=5, device=None):
+        self.model = model
+        self.idx_2_category = idx_2_category
+        self.window = window
+        self.every = every
+        self.device = device
+        self.classifiers = {}
+
+    def push(self, track_ids, key_points):
+        for track_id, person in zip(track_ids.tolist(), key_points):
+            classifier = self.classifiers.get(track_id)
+            if classifier is None:
+                classifier = self.classifiers[track_id] = StreamingClassifier(self.model, self.idx_2_category, self.window, self.every, self.device)
+            classifier.push(person)
+
+    def active_mask(self, track_ids, names):
+        # (people, exercises) mask in detection order
+        return np.stack([self.classifiers[track_id].active_mask(names) for track_id in track_ids.tolist()])
+
+    def prune(self, live_ids):
+        live_ids = set(np.asarray(live_ids).tolist())
+        for track_id in [track_id for track_id in self.classifiers if track_id not in live_ids]:
+            del self.classifiers[track_id]
@@ -0,0 +1,49 @@
+# On-disk cache of per-frame pose keypoints for recorded videos
+import os
+import hashlib
+import numpy as np
+
+DEFAULT_DIR = ".keypoint_cache"
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def pack_frames(frames):
+    # list of (people, 17, 2) arrays -> zero-padded (frames, max_people, 17, 2) array and per-frame people counts
+    people = np.array([len(key_points) for key_points in frames], dtype=np.int16)
+    packed = np.zeros((len(frames), int(people.max(initial=0)), 17, 2), dtype=np.float32)
+    for i, key_points in enumerate(frames):
+        packed[i, :len(key_points)] = np.asarray(key_points)[..., :2]
+    return packed, people
+
+def unpack_frames(packed, people):
+    return [packed[i, :n] for i, n in enumerate(people.tolist())]
+
+class KeypointCache:
+    # Entries are keyed by the video's content hash plus a tag for the pose model
+    # settings that produced them, so renamed or copied videos still hit the cache.
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+
+    def path_for(self, video_hash, tag):
+        return os.path.join(self.directory, f"{video_hash}_{tag}.npz")
+
+    def load(self, video_hash, tag):
+        path = self.path_for(video_hash, tag)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return unpack_frames(data["key_points"], data["people"]), float(data["fps"])
+
+    def save(self, video_hash, tag, frames, fps):
+        os.makedirs(self.directory, exist_ok=True)
+        packed, people = pack_frames(frames)
+        path = self.path_for(video_hash, tag)
+        temp_path = path + ".tmp.npz"
+        np.savez_compressed(temp_path, key_points=packed, people=people, fps=np.float64(fps))
+        os.replace(temp_path, path)
+        return path
@@ -0,0 +1,188 @@
+# Columnar loader for exercise_count.txt style logs
+import os
+import re
+import mmap
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+LINE_PATTERN = re.compile(
+    rb"^[A-Za-z]+ (\d\d)/(\d\d)/(\d\d) (\d\d):(\d\d) ([AP])M, (\d+) push-ups, (\d+) squats, (\d+) sit-ups\r?$",
+    re.MULTILINE)
+CHUNK_SIZE = 64 * 1024 * 1024
+
+def _at(data, positions):
+    # Bounds-safe gather; positions of rejected lines may point outside the chunk
+    return data[np.clip(positions, 0, len(data) - 1)]
+
+def _digits(data, positions, width):
+    # Decimal value of `width` ASCII digits starting at each position, plus a validity mask
+    digits = _at(data, positions[:, None] + np.arange(width)).astype(np.int64) - 48
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    return digits @ (10 ** np.arange(width - 1, -1, -1)), valid
+
+def _to_datetime(month, day, year, hour, minute, pm):
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & (hour >= 1) & (hour <= 12) & (minute < 60)
+    months = ((2000 + year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (np.clip(day, 1, 31) - 1)
+    # the day must still fall inside its month (rejects e.g. 02/30)
+    valid &= days.astype("datetime64[M]") == months
+    dates = days.astype("datetime64[m]") + ((hour % 12 + 12 * pm) * 60 + minute).astype("timedelta64[m]")
+    return dates, valid
+
+def _matches(data, positions, text):
+    # True where the bytes at each position spell out `text`
+    expected = np.frombuffer(text, dtype=np.uint8)
+    return (_at(data, positions[:, None] + np.arange(len(text))) == expected).all(axis=1)
+
+def _parse_fixed(data, starts, ends):
+    # Vectorized parse of "<Weekday> MM/DD/YY HH:MM AM, N push-ups, N squats, N sit-ups" lines
+    # given as [start, end) byte ranges of `data`. Returns dates, (lines, 3) counts and a validity
+    # mask; a line is only valid if it matches LINE_PATTERN byte for byte.
+    letters = ((data | 0x20) >= ord("a")) & ((data | 0x20) <= ord("z"))
+    non_letters = np.concatenate([[0], np.cumsum(~letters)])
+    slashes = np.flatnonzero(data == ord("/"))
+    commas = np.flatnonzero(data == ord(","))
+    spaces = np.flatnonzero(data == ord(" "))
+    first_slash = np.searchsorted(slashes, starts)
+    first_comma = np.searchsorted(commas, starts)
+    valid = ((np.searchsorted(slashes, ends) - first_slash == 2) & (np.searchsorted(commas, ends) - first_comma == 3))
+
+    slash = slashes[np.minimum(first_slash, len(slashes) - 1)] if len(slashes) else np.zeros_like(starts)
+    valid &= (slash - starts >= 5) & (slash + 16 < ends)
+    slash = np.where(valid, slash, 2)
+    # the weekday is one or more letters followed by a space
+    weekday_end = np.maximum(slash - 3, starts)
+    valid &= (weekday_end > starts) & (non_letters[weekday_end] == non_letters[starts]) & (_at(data, slash - 3) == ord(" "))
+    month, ok_month = _digits(data, slash - 2, 2)
+    day, ok_day = _digits(data, slash + 1, 2)
+    year, ok_year = _digits(data, slash + 4, 2)
+    hour, ok_hour = _digits(data, slash + 7, 2)
+    minute, ok_minute = _digits(data, slash + 10, 2)
+    meridiem = _at(data, slash + 13)
+    valid &= ok_month & ok_day & ok_year & ok_hour & ok_minute
+    valid &= (_at(data, slash + 3) == ord("/")) & (_at(data, slash + 6) == ord(" ")) & (_at(data, slash + 9) == ord(":"))
+    valid &= (_at(data, slash + 12) == ord(" ")) & ((meridiem == ord("A")) | (meridiem == ord("P"))) & _matches(data, slash + 14, b"M,")
+    dates, ok_date = _to_datetime(month, day, year, hour, minute, meridiem == ord("P"))
+    valid &= ok_date
+
+    counts = np.zeros((len(starts), 3), dtype=np.int64)
+    labels = (b"push-ups", b"squats", b"sit-ups")
+    line_commas = [commas[np.minimum(first_comma + column, len(commas) - 1)] if len(commas) else np.zeros_like(starts) for column in range(3)]
+    valid &= line_commas[0] == slash + 15
+    for column, label in enumerate(labels):
+        comma = line_commas[column]
+        # ", N <label>" up to the next comma (or the end of the line for the last column)
+        label_end = line_commas[column + 1] if column + 1 < len(labels) else ends
+        valid &= _at(data, comma + 1) == ord(" ")
+        number_start = comma + 2
+        number_end = spaces[np.minimum(np.searchsorted(spaces, number_start), len(spaces) - 1)] if len(spaces) else number_start
+        width = number_end - number_start
+        valid &= (width >= 1) & (width <= 9) & (number_end + 1 + len(label) == label_end)
+        width = np.where(valid, width, 0)
+        for k in range(int(width.max(initial=0))):
+            position = np.where(k < width, number_end - 1 - k, number_start)
+            digit = _at(data, position).astype(np.int64) - 48
+            valid &= (k >= width) | ((digit >= 0) & (digit <= 9))
+            counts[:, column] += np.where(k < width, digit, 0) * 10 ** k
+        valid &= _matches(data, number_end + 1, label)
+    return dates, counts, valid
+
+def _parse_line(line):
+    match = LINE_PATTERN.match(line)
+    if match is None:
+        return None
+    month, day, year, hour, minute, meridiem, push_ups, squats, sit_ups = match.groups()
+    dates, valid = _to_datetime(*(np.array([int(value)]) for value in (month, day, year, hour, minute)), np.array([meridiem == b"P"]))
+    if not valid[0]:
+        return None
+    return dates[0], [int(push_ups), int(squats), int(sit_ups)]
+
+def _parse_chunk(chunk, first_line, errors):
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord("\n"))
+    ends = newlines if chunk.endswith(b"\n") else np.append(newlines, len(data))
+    starts = np.concatenate([[0], newlines + 1])[:len(ends)]
+    # drop the \r of CRLF line endings
+    if len(data):
+        ends = ends - (data[np.maximum(ends - 1, 0)] == ord("\r")) * (ends > starts)
+    dates, counts, valid = _parse_fixed(data, starts, ends)
+
+    # Anything the fixed-layout parser rejects goes through the regex, then into `errors`
+    for i in np.flatnonzero(~valid):
+        line = chunk[starts[i]:ends[i]]
+        if not line.strip():
+            continue
+        parsed = _parse_line(line)
+        if parsed is None:
+            errors.append((first_line + int(i), line.decode(errors="replace")))
+        else:
+            valid[i] = True
+            dates[i] = parsed[0]
+            counts[i] = parsed[1]
+    return dates[valid], counts[valid], len(starts)
+
+def _chunks(buffer, chunk_size):
+    start, size = 0, len(buffer)
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = buffer.rfind(b"\n", start, end)
+            end = newline + 1 if newline >= start else (buffer.find(b"\n", end) + 1 or size)
+        yield buffer[start:end]
+        start = end
+
+def load_log(path, chunk_size=CHUNK_SIZE):
+    # Returns {"dates": datetime64[m], "push_ups", "squats", "sit_ups": int64 arrays,
+    # "errors": [(line_number, line)]} with one entry per well-formed line.
+    dates, counts, errors = [], [], []
+    if os.path.getsize(path) > 0:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            line_number = 1
+            for chunk in _chunks(buffer, chunk_size):
+                chunk_dates, chunk_counts, lines = _parse_chunk(chunk, line_number, errors)
+                dates.append(chunk_dates)
+                counts.append(chunk_counts)
+                line_number += lines
+
+    dates = np.concatenate(dates) if dates else np.empty(0, dtype="datetime64[m]")
+    counts = np.concatenate(counts) if counts else np.empty((0, 3), dtype=np.int64)
+    return {"dates": dates, "push_ups": counts[:, 0], "squats": counts[:, 1], "sit_ups": counts[:, 2], "errors": errors}
+
+def write_synthetic_log(path, lines, seed=0):
+    rng = random.Random(seed)
+    start = np.datetime64("2020-01-01T06:00")
+    with open(path, "w") as file:
+        for i in range(lines):
+            moment = (start + np.timedelta64(i * 7, "m")).astype(object)
+            file.write(f"{moment.strftime('%A %m/%d/%y %I:%M %p')}, {rng.randint(0, 60)} push-ups, "
+                       f"{rng.randint(0, 60)} squats, {rng.randint(0, 60)} sit-ups\n")
+
+def benchmark(lines=1000000):
+    from session_store import parse_log_line
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "exercise_count.txt")
+        write_synthetic_log(path, lines)
+
+        start = time.perf_counter()
+        with open(path, "r") as file:
+            reference = [parse_log_line(line) for line in file if line.strip()]
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = load_log(path)
+        columnar_time = time.perf_counter() - start
+
+    assert len(parsed["dates"]) == len(reference) and not parsed["errors"]
+    assert parsed["dates"][-1].astype(object) == reference[-1][0]
+    assert parsed["push_ups"][-1] == reference[-1][1]["pushup"]
+    print(f"{lines} lines: strptime parser {reference_time:.2f}s, columnar parser {columnar_time:.2f}s "
+          f"({reference_time / columnar_time:.1f}x faster)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the columnar exercise log parser")
+    parser.add_argument("--lines", type=int, default=1000000)
+    args = parser.parse_args()
+    benchmark(args.lines)
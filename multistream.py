@@ -0,0 +1,285 @@
+# Multi-camera mode: one capture process per stream writes frames into a shared-memory
+# ring buffer and a single inference process runs batched pose inference across streams
+import os
+import time
+import queue
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from counting import sport_list, CountingEngine, pose_keypoints, HYSTERESIS
+from profiling import RollingHistogram
+from session_store import SessionStore
+
+# header slots: latest sequence number, closed flag, then (sequence, capture time) per frame slot
+_LATEST = 0
+_CLOSED = 1
+_HEADER = 2
+
+class FrameRing:
+    # Fixed-size frames in shared memory. The writer fills slot seq % slots and then
+    # publishes seq; readers copy the latest slot and re-check its sequence number,
+    # so a frame overwritten mid-copy is detected and re-read instead of torn.
+    def __init__(self, shape, slots=4, name=None, create=False):
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_size = (_HEADER + 2 * slots) * 8
+        frame_size = int(np.prod(self.shape))
+        if create:
+            self.memory = shared_memory.SharedMemory(create=True, size=header_size + frame_size * slots)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.header = np.ndarray((_HEADER + 2 * slots,), dtype=np.int64, buffer=self.memory.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf, offset=header_size)
+        if create:
+            self.header[:] = 0
+
+    def write(self, frame, timestamp_ns):
+        seq = int(self.header[_LATEST]) + 1
+        slot = seq % self.slots
+        self.header[_HEADER + 2 * slot] = -1
+        self.frames[slot] = frame
+        self.header[_HEADER + 2 * slot + 1] = timestamp_ns
+        self.header[_HEADER + 2 * slot] = seq
+        self.header[_LATEST] = seq
+
+    def latest_seq(self):
+        return int(self.header[_LATEST])
+
+    def read_latest(self, out):
+        # Copies the newest frame into `out`; returns (seq, capture time) or None if nothing was written yet
+        while True:
+            seq = int(self.header[_LATEST])
+            if seq == 0:
+                return None
+            slot = seq % self.slots
+            timestamp_ns = int(self.header[_HEADER + 2 * slot + 1])
+            out[...] = self.frames[slot]
+            if int(self.header[_HEADER + 2 * slot]) == seq:
+                return seq, timestamp_ns
+
+    def close_stream(self):
+        self.header[_CLOSED] = 1
+
+    def closed(self):
+        return bool(self.header[_CLOSED])
+
+    def close(self):
+        del self.header, self.frames
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+def letterbox(frame, out):
+    # Scales `frame` to fit `out` with its aspect ratio kept and centres it on gray padding,
+    # so joint angles measured on the pose are the same as on the source frame
+    height, width = out.shape[:2]
+    h, w = frame.shape[:2]
+    if (h, w) == (height, width):
+        out[...] = frame
+        return out
+    scale = min(width / w, height / h)
+    new_w, new_h = min(round(w * scale), width), min(round(h * scale), height)
+    top, left = (height - new_h) // 2, (width - new_w) // 2
+    out[...] = 114
+    out[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return out
+
+def _capture_main(source, ring_name, shape, slots, stop_event):
+    ring = FrameRing(shape, slots, ring_name)
+    cap = cv2.VideoCapture(int(source) if str(source).isnumeric() else source)
+    # Recorded files are paced at their own frame rate so they behave like cameras
+    interval = 0.0 if str(source).isnumeric() else 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    canvas = np.empty(shape, dtype=np.uint8)
+    next_frame = time.perf_counter()
+    try:
+        while not stop_event.is_set() and cap.isOpened():
+            success, frame = cap.read()
+            if not success:
+                break
+            ring.write(letterbox(frame, canvas), time.perf_counter_ns())
+            if interval:
+                next_frame += interval
+                time.sleep(max(0.0, next_frame - time.perf_counter()))
+    finally:
+        cap.release()
+        ring.close_stream()
+        ring.close()
+
+class StreamCounter:
+    # Counters, latency samples and session log of one stream
+    def __init__(self, name, store_path, table=sport_list, hysteresis=HYSTERESIS):
+        self.name = name
+        self.store_path = store_path
+        self.engine = CountingEngine(table, hysteresis)
+        self.latency = RollingHistogram()
+        self.frames = 0
+        self.dropped = 0
+        self.last_seq = 0
+
+    def update(self, seq, key_points, latency_s):
+        self.dropped += max(seq - self.last_seq - 1, 0)
+        self.last_seq = seq
+        self.frames += 1
+        if len(key_points):
+            self.engine.update(key_points[0])
+        self.latency.add(latency_s)
+
+    def report(self):
+        latency = self.latency.values()
+        p50, p95 = np.percentile(latency, [50, 95]) * 1000 if len(latency) else (0.0, 0.0)
+        return {"frames": self.frames, "dropped": self.dropped, "counts": self.engine.counts(),
+                "latency_p50_ms": float(p50), "latency_p95_ms": float(p95)}
+
+    def save(self):
+        with SessionStore(self.store_path) as store:
+            store.add_session(self.engine.counts())
+
+def _inference_main(names, ring_names, shape, slots, store_paths, model_options, stop_event, reports, report_every):
+    from backends import MAX_BATCH, load_pose_model
+    model, backend = load_pose_model(**model_options)
+    max_batch = MAX_BATCH.get(backend, len(ring_names))
+    rings = [FrameRing(shape, slots, ring_name) for ring_name in ring_names]
+    streams = [StreamCounter(name, path) for name, path in zip(names, store_paths)]
+    batch = np.empty((len(rings),) + tuple(shape), dtype=np.uint8)
+    batches = 0
+    start = last_report = time.perf_counter()
+    reports.put(("ready", backend))
+
+    def report(kind):
+        elapsed = time.perf_counter() - start
+        frames = sum(stream.frames for stream in streams)
+        reports.put((kind, {"elapsed": elapsed, "frames": frames, "throughput_fps": frames / elapsed if elapsed else 0.0,
+                            "batches": batches, "mean_batch": frames / batches if batches else 0.0,
+                            "streams": {stream.name: stream.report() for stream in streams}}))
+
+    try:
+        while not stop_event.is_set():
+            # Gather the newest unseen frame of every stream into one batch
+            rows, seqs, captured = [], [], []
+            for i, (ring, stream) in enumerate(zip(rings, streams)):
+                if ring.latest_seq() > stream.last_seq:
+                    read = ring.read_latest(batch[len(rows)])
+                    rows.append(i)
+                    seqs.append(read[0])
+                    captured.append(read[1])
+            if not rows:
+                if all(ring.closed() for ring in rings):
+                    break
+                time.sleep(0.001)
+                continue
+
+            results = []
+            for i in range(0, len(rows), max_batch):
+                results += model(list(batch[i:min(i + max_batch, len(rows))]), verbose=False)
+            done = time.perf_counter_ns()
+            batches += 1
+            for i, seq, timestamp_ns, result in zip(rows, seqs, captured, results):
+                streams[i].update(seq, pose_keypoints(result), (done - timestamp_ns) / 1e9)
+
+            if report_every and time.perf_counter() - last_report >= report_every:
+                last_report = time.perf_counter()
+                report("progress")
+    finally:
+        for stream in streams:
+            stream.save()
+        report("final")
+        for ring in rings:
+            ring.close()
+
+def stream_names(sources, names=None):
+    names = list(names or [])
+    return names + [f"stream{i}" for i in range(len(names), len(sources))]
+
+def print_report(report):
+    print(f"{report['frames']} frames in {report['elapsed']:.1f}s: {report['throughput_fps']:.1f} fps total, "
+          f"{report['batches']} batches (mean size {report['mean_batch']:.2f})")
+    for name, stream in report["streams"].items():
+        print(f"  {name}: {stream['frames']} frames, {stream['dropped']} dropped, latency p50 {stream['latency_p50_ms']:.1f} ms "
+              f"/ p95 {stream['latency_p95_ms']:.1f} ms, counts {stream['counts']}")
+
+def run(sources, names=None, width=640, height=480, slots=4, store_dir=".", duration=None, report_every=5.0, model_options=None):
+    context = multiprocessing.get_context("spawn")
+    names = stream_names(sources, names)
+    shape = (height, width, 3)
+    rings = [FrameRing(shape, slots, create=True) for _ in sources]
+    store_paths = [os.path.join(store_dir, f"exercise_count_{name}.db") for name in names]
+    stop_event = context.Event()
+    reports = context.Queue()
+
+    inference = context.Process(target=_inference_main, name="inference",
+                                args=(names, [ring.name for ring in rings], shape, slots, store_paths, model_options or {},
+                                      stop_event, reports, report_every))
+    captures = [context.Process(target=_capture_main, name=f"capture-{name}", args=(source, ring.name, shape, slots, stop_event))
+                for source, name, ring in zip(sources, names, rings)]
+    final = None
+    try:
+        inference.start()
+        # Cameras only start once the model is loaded so the first frames are not stale
+        backend = None
+        while backend is None:
+            try:
+                kind, backend = reports.get(timeout=0.5)
+            except queue.Empty:
+                if not inference.is_alive():
+                    raise RuntimeError(f"Inference process exited with code {inference.exitcode} while loading the model")
+        print("Pose model backend:", backend)
+        for capture in captures:
+            capture.start()
+        deadline = time.monotonic() + duration if duration else None
+        while final is None and inference.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                stop_event.set()
+            try:
+                kind, report = reports.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if kind == "final":
+                final = report
+            else:
+                print_report(report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        if final is None:
+            try:
+                final = reports.get(timeout=10)[1]
+            except queue.Empty:
+                pass
+        for process in captures + [inference]:
+            if process.pid is not None:
+                process.join(timeout=5)
+        for ring in rings:
+            ring.close()
+            ring.unlink()
+    return final
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps on several cameras / videos with one batched pose model")
+    parser.add_argument('sources', nargs='+', help='camera indices or video file paths')
+    parser.add_argument('--names', nargs='*', default=None, help='stream names used for the per-stream session logs')
+    parser.add_argument('--width', type=int, default=640, help='frames are letterboxed to width x height in the capture process')
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--slots', type=int, default=4, help='frames per shared-memory ring buffer')
+    parser.add_argument('--store-dir', default='.', help='directory for the exercise_count_<stream>.db session logs')
+    parser.add_argument('--duration', type=float, default=None, help='stop after this many seconds (default: until every source ends or Ctrl+C)')
+    parser.add_argument('--report-every', type=float, default=5.0, help='seconds between progress reports')
+    parser.add_argument('--model', default='model/yolov8s-pose')
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--int8', action='store_true')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+
+    model_options = {"base": args.model, "backend": args.backend, "int8": args.int8, "threads": args.threads, "imgsz": args.imgsz}
+    final = run(args.sources, args.names, args.width, args.height, args.slots, args.store_dir, args.duration, args.report_every, model_options)
+    if final is not None:
+        print("Final report:")
+        print_report(final)
+
+if __name__ == '__main__':
+    main()
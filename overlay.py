@@ -0,0 +1,104 @@
+# HUD and skeleton rendering for the detection window
+import cv2
+import numpy as np
+from counting import sport_list
+
+class _TextLayer:
+    # Pre-rendered text cropped to its bounding box, with the mask of its opaque pixels
+    def __init__(self):
+        self.key = None
+        self.image = None
+        self.mask = None
+        self.box = None
+
+    def update(self, key, layer):
+        self.key = key
+        # Faint anti-aliased edge pixels (newer OpenCV always smooths text) are left out of the mask
+        mask = layer.max(axis=2) >= 128
+        rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        if len(rows):
+            self.box = (rows[0], rows[-1] + 1, cols[0], cols[-1] + 1)
+            y1, y2, x1, x2 = self.box
+            self.image = layer[y1:y2, x1:x2].copy()
+            self.mask = mask[y1:y2, x1:x2].astype(np.uint8)
+        else:
+            self.box = None
+
+    def draw(self, image):
+        if self.box is not None:
+            y1, y2, x1, x2 = self.box
+            cv2.copyTo(self.image, self.mask, image[y1:y2, x1:x2])
+
+class OverlayRenderer:
+    # The HUD lines and the footer (frequently changing stats) are separate text layers, each
+    # only redrawn when its own lines change; every frame each is composited with one masked
+    # cv2.copyTo over its bounding box. Skeletons of the active
+    # exercises are drawn with one cv2.polylines call for all segments of all people.
+    def __init__(self, table=sport_list, scale=1.0, color=(0, 255, 0), footer_color=(0, 255, 255), skeleton_color=(255, 128, 0)):
+        self.names = list(table)
+        self.scale = scale
+        self.color = color
+        self.footer_color = footer_color
+        self.skeleton_color = skeleton_color
+        # concerned_skeletons_idx pairs are 1-based (COCO skeleton), concerned_key_points_idx are 0-based
+        self.segments = [np.array(sport['concerned_skeletons_idx'], dtype=np.intp).reshape(-1, 2) - 1 for sport in table.values()]
+        self.joints = [np.array(sport['concerned_key_points_idx'], dtype=np.intp) for sport in table.values()]
+        self._skeleton_cache = {}
+        self._lines = _TextLayer()
+        self._footer = _TextLayer()
+
+    def _skeleton(self, active):
+        # (segments, 2) keypoint index pairs for the active exercises; joints become zero-length segments (dots)
+        key = None if active is None else np.asarray(active, dtype=bool).tobytes()
+        if key not in self._skeleton_cache:
+            chosen = range(len(self.names)) if active is None else np.flatnonzero(active)
+            pairs = [self.segments[i] for i in chosen] + [np.repeat(self.joints[i][:, None], 2, axis=1) for i in chosen]
+            pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.intp)
+            self._skeleton_cache[key] = np.unique(pairs, axis=0)
+        return self._skeleton_cache[key]
+
+    def _draw_lines(self, shape, lines):
+        layer = np.zeros(shape, dtype=np.uint8)
+        scale = self.scale
+        thickness = max(1, round(2 * scale))
+        for i, line in enumerate(lines):
+            cv2.putText(layer, line, (int(20 * scale), int((50 + i * 50) * scale)), cv2.FONT_HERSHEY_SIMPLEX, scale, self.color, thickness, cv2.LINE_8)
+        return layer
+
+    def _draw_footer(self, shape, footer):
+        layer = np.zeros(shape, dtype=np.uint8)
+        scale = self.scale
+        for i, line in enumerate(footer):
+            y = shape[0] - int((20 + (len(footer) - 1 - i) * 25) * scale)
+            cv2.putText(layer, line, (int(20 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.6 * scale, self.footer_color, max(1, round(scale)), cv2.LINE_8)
+        return layer
+
+    def render(self, frame, lines, key_points=None, active=None, footer=()):
+        # Returns the image to show: `frame` (resized when scale != 1) with the skeleton and HUD drawn on it
+        image = frame
+        if self.scale != 1.0:
+            height, width = frame.shape[:2]
+            image = cv2.resize(frame, (int(width * self.scale), int(height * self.scale)), interpolation=cv2.INTER_AREA)
+
+        if key_points is not None and len(key_points):
+            pairs = self._skeleton(active)
+            if len(pairs):
+                points = np.asarray(key_points, dtype=np.float32)[:, pairs, :2]
+                # undetected keypoints are reported at (0, 0)
+                visible = (points > 0).any(axis=-1).all(axis=-1)
+                segments = np.round(points[visible] * self.scale).astype(np.int32)
+                if len(segments):
+                    cv2.polylines(image, list(segments), False, self.skeleton_color, max(2, round(4 * self.scale)), cv2.LINE_AA)
+
+        key = (tuple(lines), image.shape)
+        if key != self._lines.key:
+            self._lines.update(key, self._draw_lines(image.shape, lines))
+        key = (tuple(footer), image.shape)
+        if key != self._footer.key:
+            self._footer.update(key, self._draw_footer(image.shape, footer))
+        self._lines.draw(image)
+        self._footer.draw(image)
+        return image
+
+    def scale_point(self, point):
+        return int(point[0] * self.scale), int(point[1] * self.scale)
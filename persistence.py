@@ -0,0 +1,158 @@
+# Write-behind checkpoints of the running session's counts, recovered into the session store after a crash
+import os
+import glob
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime
+from session_store import DEFAULT_PATH
+
+log = logging.getLogger("detection.persistence")
+
+# session ids of the checkpointers that are still running in this process
+_live_sessions = set()
+
+def checkpoint_path(session_id, store_path=DEFAULT_PATH):
+    # Every session has its own file, so concurrent sessions never share (or recover) each other's
+    return f"{store_path}.{session_id}.checkpoint"
+
+def _process_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # ERROR_ACCESS_DENIED: it exists but belongs to someone else
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _orphaned(checkpoint):
+    # A checkpoint is only recovered once the session that writes it can no longer finish
+    pid = checkpoint.get("pid")
+    if pid == os.getpid():
+        return checkpoint["session_id"] not in _live_sessions
+    return pid is None or not _process_alive(pid)
+
+def write_atomic(path, data, fsync=True):
+    # The checkpoint is either the old or the new file, never a partial one
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if fsync and os.name == "posix":
+        # make the rename itself durable
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+def read_checkpoint(path):
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        log.warning("Ignoring unreadable checkpoint %s", path)
+        return None
+
+def recover_checkpoints(store, store_path=DEFAULT_PATH):
+    # Adds the counts of every session that never finished (crash, kill, power loss) to the
+    # store and removes its checkpoint; checkpoints of sessions still running are left alone.
+    # Returns the list of recovered counts.
+    recovered = []
+    for path in sorted(glob.glob(glob.escape(store_path) + ".*.checkpoint")):
+        checkpoint = read_checkpoint(path)
+        if checkpoint is not None:
+            if not _orphaned(checkpoint):
+                continue
+            store.add_session(checkpoint["counts"], datetime.fromisoformat(checkpoint["updated_at"]), key="session:" + checkpoint["session_id"])
+            recovered.append(checkpoint["counts"])
+        for leftover in (path, path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return recovered
+
+class SessionCheckpointer:
+    # The frame loop only hands over the latest counts; a background thread writes them
+    # to the checkpoint file at most every `interval` seconds and only when they changed,
+    # so at most `interval` seconds of reps are lost if the process dies.
+    def __init__(self, store_path=DEFAULT_PATH, interval=2.0, fsync=True):
+        self.session_id = uuid.uuid4().hex
+        self.path = checkpoint_path(self.session_id, store_path)
+        self.interval = interval
+        self.fsync = fsync
+        self.started_at = datetime.now()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._counts = None
+        self._updated_at = None
+        self._version = 0
+        self._written = 0
+        self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+        self.checkpoints = 0
+
+    def start(self):
+        _live_sessions.add(self.session_id)
+        self._thread.start()
+        return self
+
+    def update(self, counts):
+        with self._lock:
+            self._counts = dict(counts)
+            self._updated_at = datetime.now()
+            self._version += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            version, counts, updated_at = self._version, self._counts, self._updated_at
+        if version == self._written:
+            return
+        checkpoint = {"session_id": self.session_id, "pid": os.getpid(), "started_at": self.started_at.isoformat(timespec="seconds"),
+                      "updated_at": updated_at.isoformat(timespec="seconds"), "counts": counts}
+        try:
+            write_atomic(self.path, json.dumps(checkpoint).encode(), self.fsync)
+        except OSError as e:
+            log.warning("Could not write checkpoint %s: %s", self.path, e)
+            return
+        self._written = version
+        self.checkpoints += 1
+
+    def abandon(self):
+        # Stops the writer after a last checkpoint, for a session that ends without finish()
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+        _live_sessions.discard(self.session_id)
+
+    def finish(self, store, counts):
+        # Stops the writer, stores the final counts as this session and drops the checkpoint
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.update(counts)
+        self.flush()
+        store.add_session(self._counts, self._updated_at, key="session:" + self.session_id)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        _live_sessions.discard(self.session_id)
@@ -0,0 +1,147 @@
+# Staged capture / inference / render pipeline for the detection loop
+import queue
+import threading
+from profiling import StageProfiler
+
+DROP_LATEST = "latest"
+DROP_NEVER = "never"
+_STOP = object()
+
+class StageQueue:
+    def __init__(self, maxsize, drop_policy):
+        if drop_policy not in (DROP_LATEST, DROP_NEVER):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def put(self, item, stop_event):
+        if self.drop_policy == DROP_LATEST and item is not _STOP:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        while not stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def depth(self):
+        return self.queue.qsize()
+
+class FramePipeline:
+    # Capture and inference run on worker threads; rendering stays on the caller's
+    # thread because cv2.imshow / cv2.waitKey must run on the main thread.
+    def __init__(self, cap, infer, drop_policy=DROP_LATEST, queue_size=2, profiler=None):
+        self.cap = cap
+        self.infer = infer
+        self.profiler = profiler or StageProfiler(enabled=False)
+        self.drop_policy = drop_policy
+        self.stop_event = threading.Event()
+        self.frames = StageQueue(queue_size, drop_policy)
+        self.results = StageQueue(queue_size, drop_policy)
+        self.captured = 0
+        self.inferred = 0
+        self.rendered = 0
+        self.error = None
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+
+    def _capture_loop(self):
+        try:
+            while not self.stop_event.is_set() and self.cap.isOpened():
+                with self.profiler.stage("capture"):
+                    success, frame = self.cap.read()
+                if not success:
+                    break
+                self.captured += 1
+                if not self.frames.put(frame, self.stop_event):
+                    return
+        except Exception as e:
+            self.error = e
+        self.frames.put(_STOP, self.stop_event)
+
+    def _inference_loop(self):
+        try:
+            while True:
+                frame = self.frames.get(self.stop_event)
+                if frame is _STOP:
+                    break
+                with self.profiler.stage("inference"):
+                    results = self.infer(frame)
+                self.inferred += 1
+                if not self.results.put((frame, results), self.stop_event):
+                    return
+        except Exception as e:
+            self.error = e
+        self.results.put(_STOP, self.stop_event)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def queue_depths(self):
+        return {"capture": self.frames.depth(), "inference": self.results.depth()}
+
+    def dropped(self):
+        return self.frames.dropped + self.results.dropped
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "inferred": self.inferred,
+            "rendered": self.rendered,
+            "dropped_capture": self.frames.dropped,
+            "dropped_inference": self.results.dropped,
+            "queue_depths": self.queue_depths(),
+        }
+
+    def __iter__(self):
+        while True:
+            item = self.results.get(self.stop_event)
+            if item is _STOP:
+                break
+            self.rendered += 1
+            yield item
+        if self.error is not None:
+            raise self.error
+
+def sequential_frames(cap, infer, profiler=None):
+    profiler = profiler or StageProfiler(enabled=False)
+    while cap.isOpened():
+        with profiler.stage("capture"):
+            success, frame = cap.read()
+        if not success:
+            break
+        with profiler.stage("inference"):
+            results = infer(frame)
+        yield frame, results
+
+def default_drop_policy(source):
+    # Live cameras should never build up lag; recorded files must not lose frames.
+    return DROP_LATEST if str(source).isnumeric() else DROP_NEVER
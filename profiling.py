@@ -0,0 +1,137 @@
+# Per-stage timing and rate-limited logging for the detection loop
+import csv
+import json
+import time
+import logging
+import threading
+import numpy as np
+
+class RollingHistogram:
+    # Fixed-size ring of the most recent samples; percentiles are computed on demand
+    def __init__(self, size=1000):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.position = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.position] = value
+        self.position = (self.position + 1) % len(self.samples)
+        self.count += 1
+
+    def values(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+class _StageTimer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter() - self.start)
+
+class _NullTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+class StageProfiler:
+    def __init__(self, enabled=True, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self.timers = {}
+        self.frame_times = RollingHistogram(window)
+        self.frames = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, RollingHistogram(self.window))
+        return histogram
+
+    def stage(self, name):
+        # Usage: with profiler.stage("inference"): ...
+        if not self.enabled:
+            return _NULL_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers.setdefault(name, _StageTimer(self._histogram(name)))
+        return timer
+
+    def frame_done(self):
+        self.frames += 1
+        if self.enabled:
+            self.frame_times.add(time.perf_counter())
+
+    def fps(self):
+        times = np.sort(self.frame_times.values())
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def summary(self):
+        stages = {}
+        for name, histogram in list(self.histograms.items()):
+            values = histogram.values()
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+                stages[name] = {"count": histogram.count, "mean_ms": float(values.mean() * 1000),
+                                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+        return {"frames": self.frames, "dropped_frames": self.dropped, "fps": self.fps(), "stages": stages}
+
+    def overlay_lines(self):
+        summary = self.summary()
+        lines = [f"FPS: {summary['fps']:.1f}  dropped: {summary['dropped_frames']}"]
+        for name, stage in summary["stages"].items():
+            lines.append(f"{name}: p50 {stage['p50_ms']:.1f} / p95 {stage['p95_ms']:.1f} ms")
+        return lines
+
+    def export(self, path):
+        summary = self.summary()
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+                for name, stage in summary["stages"].items():
+                    writer.writerow([name, stage["count"], stage["mean_ms"], stage["p50_ms"], stage["p95_ms"], stage["p99_ms"]])
+                writer.writerow(["fps", summary["frames"], summary["fps"], "", "", ""])
+                writer.writerow(["dropped_frames", summary["dropped_frames"], "", "", "", ""])
+        else:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+
+class RateLimitFilter(logging.Filter):
+    # Lets each distinct message through at most once per `interval` seconds
+    def __init__(self, interval=1.0):
+        super().__init__()
+        self.interval = interval
+        self.last_seen = {}
+
+    def filter(self, record):
+        key = (record.msg, record.args)
+        now = time.monotonic()
+        if now - self.last_seen.get(key, -self.interval) < self.interval:
+            return False
+        self.last_seen[key] = now
+        return True
+
+def setup_logging(level="WARNING", interval=1.0):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(RateLimitFilter(interval))
+    logger = logging.getLogger("detection")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
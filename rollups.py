@@ -0,0 +1,102 @@
+# Daily rollups with prefix sums for dashboard range queries
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+def _ordinal(day):
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    return day.toordinal()
+
+class DailyRollup:
+    # One entry per day with activity. prefix[e][i] is the sum of values[e][:i], so any
+    # date range is two bisects and a subtraction per exercise.
+    def __init__(self, exercises):
+        self.exercises = list(exercises)
+        self.days = []
+        self.values = {exercise: [] for exercise in self.exercises}
+        self.prefix = {exercise: [0] for exercise in self.exercises}
+        self.version = 0
+
+    @classmethod
+    def from_store(cls, store, exercises=("pushup", "squat", "situp")):
+        rollup = cls(exercises)
+        rollup.update_from_store(store)
+        return rollup
+
+    def update_from_store(self, store):
+        # Only days from the last known day onwards can have changed when sessions are appended
+        start = date.fromordinal(self.days[-1]).isoformat() if self.days else None
+        for day, counts in store.daily_totals(start=start):
+            self.set_day(day, counts)
+
+    def _rebuild_prefix(self, start):
+        for exercise in self.exercises:
+            prefix = self.prefix[exercise]
+            values = self.values[exercise]
+            del prefix[start + 1:]
+            for value in values[start:]:
+                prefix.append(prefix[-1] + value)
+
+    def _index(self, ordinal):
+        # Index of `ordinal` in days, inserting an empty day if needed
+        if not self.days or ordinal > self.days[-1]:
+            self.days.append(ordinal)
+            for exercise in self.exercises:
+                self.values[exercise].append(0)
+                self.prefix[exercise].append(self.prefix[exercise][-1])
+            return len(self.days) - 1
+        i = bisect_left(self.days, ordinal)
+        if self.days[i] != ordinal:
+            self.days.insert(i, ordinal)
+            for exercise in self.exercises:
+                self.values[exercise].insert(i, 0)
+            self._rebuild_prefix(i)
+        return i
+
+    def set_day(self, day, counts):
+        # Replaces the totals of one day; version only changes when a total does, so callers can cache on it
+        size = len(self.days)
+        i = self._index(_ordinal(day))
+        changed = len(self.days) != size
+        for exercise in self.exercises:
+            if exercise not in counts:
+                continue
+            old = self.values[exercise][i]
+            new = counts[exercise]
+            if new != old:
+                changed = True
+                self.values[exercise][i] = new
+                if i == len(self.days) - 1:
+                    self.prefix[exercise][-1] += new - old
+                else:
+                    self._rebuild_prefix(i)
+        if changed:
+            self.version += 1
+
+    def range_totals(self, start, end):
+        # Totals for start <= day <= end (inclusive)
+        i = bisect_left(self.days, _ordinal(start))
+        j = bisect_right(self.days, _ordinal(end))
+        return {exercise: self.prefix[exercise][j] - self.prefix[exercise][i] for exercise in self.exercises}
+
+    def day_totals(self, day):
+        return self.range_totals(day, day)
+
+    def week_totals(self, day):
+        if isinstance(day, datetime):
+            day = day.date()
+        monday = day - timedelta(days=day.weekday())
+        return self.range_totals(monday, monday + timedelta(days=6))
+
+    def month_totals(self, year, month):
+        return self.range_totals(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+
+    def year_totals(self, year):
+        return self.range_totals(date(year, 1, 1), date(year, 12, 31))
+
+    def first_day(self):
+        return date.fromordinal(self.days[0]) if self.days else None
+
+    def last_day(self):
+        return date.fromordinal(self.days[-1]) if self.days else None
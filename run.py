@@ -1,173 +1,167 @@
-import os
-import subprocess
 import tkinter as tk
 from tkinter import ttk, messagebox, StringVar
 import sys
-import threading
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
+from datetime import date, datetime, timedelta
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import calendar
+from session_store import open_store
+from rollups import DailyRollup
+from detection_worker import DetectionWorker
+from exercise_count_message import format_sessions
 
-def parse_data_from_file(filename):
-    parsed_data = {"dates": [], "push_ups": [], "squats": [], "sit_ups": []}
-    with open(filename, 'r') as file:
-        for line in file:
-            date_str, push_up_str, squats_str, sit_up_str = line.strip().split(", ")
-            date = datetime.strptime(date_str, "%A %m/%d/%y %I:%M %p")
-            push_ups = int(push_up_str.split()[0])
-            squats = int(squats_str.split()[0])
-            sit_ups = int(sit_up_str.split()[0])
-            parsed_data["dates"].append(date)
-            parsed_data["push_ups"].append(push_ups)
-            parsed_data["squats"].append(squats)
-            parsed_data["sit_ups"].append(sit_ups)
-    return parsed_data
-
-def filter_data(parsed_data, interval):
-    filtered_dates = []
-    filtered_push_ups = []
-    filtered_squats = []
-    filtered_sit_ups = []
+CHART_CACHE_SIZE = 16
+
+def append_totals(filtered_data, label, totals):
+    filtered_data["dates"].append(label)
+    filtered_data["push_ups"].append(totals["pushup"])
+    filtered_data["squats"].append(totals["squat"])
+    filtered_data["sit_ups"].append(totals["situp"])
+
+def filter_data(rollup, interval, start=None, end=None):
+    filtered_data = {"dates": [], "push_ups": [], "squats": [], "sit_ups": []}
+    first_day = rollup.first_day() or datetime.now().date()
 
     if interval == "Every Week of the Month":
-        current_month = parsed_data["dates"][0].month
-        current_year = parsed_data["dates"][0].year
-
-        first_day = datetime(current_year, current_month, 1)
-        last_day = datetime(current_year, current_month, calendar.monthrange(current_year, current_month)[1])
-
-        all_mondays = []
-        day = first_day
-        while day <= last_day:
-            if day.weekday() == 0:  # Monday
-                all_mondays.append(day)
-            day += timedelta(days=1)
-
-        for monday in all_mondays:
-            week_start = monday
-            week_end = monday + timedelta(days=6)
-            week_push_ups = sum(
-                parsed_data["push_ups"][i]
-                for i, date in enumerate(parsed_data["dates"])
-                if week_start <= date <= week_end
-            )
-            week_squats = sum(
-                parsed_data["squats"][i]
-                for i, date in enumerate(parsed_data["dates"])
-                if week_start <= date <= week_end
-            )
-            week_sit_ups = sum(
-                parsed_data["sit_ups"][i]
-                for i, date in enumerate(parsed_data["dates"])
-                if week_start <= date <= week_end
-            )
-            filtered_dates.append(f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}")
-            filtered_push_ups.append(week_push_ups)
-            filtered_squats.append(week_squats)
-            filtered_sit_ups.append(week_sit_ups)
+        current_month = first_day.month
+        current_year = first_day.year
 
-    elif interval == "Every Month of Year":
-        current_year = parsed_data["dates"][0].year
-        month_data = {}
-        for date, push_ups, squats, sit_ups in zip(parsed_data["dates"], parsed_data["push_ups"], parsed_data["squats"], parsed_data["sit_ups"]):
-            if date.year == current_year:
-                month = date.month
-                if month not in month_data:
-                    month_data[month] = {"push_ups": 0, "squats": 0, "sit_ups": 0}
-                month_data[month]["push_ups"] += push_ups
-                month_data[month]["squats"] += squats
-                month_data[month]["sit_ups"] += sit_ups
+        first_monday = first_day.replace(day=1)
+        first_monday += timedelta(days=(7 - first_monday.weekday()) % 7)
+        for monday in range(first_monday.day, calendar.monthrange(current_year, current_month)[1] + 1, 7):
+            week_start = first_monday.replace(day=monday)
+            week_end = week_start + timedelta(days=6)
+            append_totals(filtered_data, f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}",
+                          rollup.range_totals(week_start, week_end))
 
+    elif interval == "Every Month of Year":
+        current_year = first_day.year
         for month in range(1, 13):
-            if month in month_data:
-                filtered_dates.append(calendar.month_name[month])
-                filtered_push_ups.append(month_data[month]["push_ups"])
-                filtered_squats.append(month_data[month]["squats"])
-                filtered_sit_ups.append(month_data[month]["sit_ups"])
-            else:
-                filtered_dates.append(calendar.month_name[month])
-                filtered_push_ups.append(0)
-                filtered_squats.append(0)
-                filtered_sit_ups.append(0)
+            append_totals(filtered_data, calendar.month_name[month], rollup.month_totals(current_year, month))
 
     elif interval == "Today":
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_push_ups = sum(
-            parsed_data["push_ups"][i]
-            for i, date in enumerate(parsed_data["dates"])
-            if date.strftime("%Y-%m-%d") == today
-        )
-        today_squats = sum(
-            parsed_data["squats"][i]
-            for i, date in enumerate(parsed_data["dates"])
-            if date.strftime("%Y-%m-%d") == today
-        )
-        today_sit_ups = sum(
-            parsed_data["sit_ups"][i]
-            for i, date in enumerate(parsed_data["dates"])
-            if date.strftime("%Y-%m-%d") == today
-        )
-        filtered_dates.append(today)
-        filtered_push_ups.append(today_push_ups)
-        filtered_squats.append(today_squats)
-        filtered_sit_ups.append(today_sit_ups)
-
-    return {"dates": filtered_dates, "push_ups": filtered_push_ups, "squats": filtered_squats, "sit_ups": filtered_sit_ups}
+        today = datetime.now().date()
+        append_totals(filtered_data, today.strftime("%Y-%m-%d"), rollup.day_totals(today))
 
-def update_chart():
-    global parsed_data
-    global chart_tab
-
-    selected_interval = filter_var.get()
-    
-    filtered_data = filter_data(parsed_data, selected_interval)
+    elif interval == "Custom Range" and start is not None and end is not None:
+        append_totals(filtered_data, f"{start} to {end}", rollup.range_totals(start, end))
 
-    for widget in chart_tab.winfo_children():
-        widget.destroy()
+    return filtered_data
 
-    fig, ax = plt.subplots()
-    
+class ChartView:
+    # One figure and canvas for the lifetime of the window; bars are resized in
+    # place and only rebuilt when the number of intervals changes.
+    series = [("push_ups", "Push-ups"), ("squats", "Squats"), ("sit_ups", "Sit-ups")]
     bar_width = 0.25  # Width of the bars
-    dates = filtered_data["dates"]
-    indices = range(len(dates))
-
-    # Plot each exercise type separately
-    ax.bar([i - bar_width for i in indices], filtered_data["push_ups"], width=bar_width, label='Push-ups')
-    ax.bar(indices, filtered_data["squats"], width=bar_width, label='Squats')
-    ax.bar([i + bar_width for i in indices], filtered_data["sit_ups"], width=bar_width, label='Sit-ups')
-
-    ax.set_xlabel('Date and Time')
-    ax.set_ylabel('Number of exercises')
-    ax.set_title('Exercises Over Time')
-    ax.set_xticks(indices)
-    ax.set_xticklabels(dates, rotation=45, ha='right')
-    ax.legend()
-
-    canvas = FigureCanvasTkAgg(fig, master=chart_tab)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-
-def run_main_script():
-    script_name = "test object detection.py"
-    script_path = os.path.join(os.getcwd(), script_name)
-    print(f"Running script at path: {script_path}")
-    if not os.path.isfile(script_path):
-        messagebox.showerror("Error", f"Script file not found: {script_path}")
-        return
-    try:
-        subprocess.run(["python", script_path], check=True)
-    except subprocess.CalledProcessError as e:
-        messagebox.showerror("Error", f"Error running main script: {e}")
-    finally:
-        global main_script_executed
-        main_script_executed = True
-        run_button.config(state=tk.DISABLED)
-        root.after(0, root.quit)
+
+    def __init__(self, master):
+        self.figure = Figure()
+        self.ax = self.figure.add_subplot()
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.containers = None
+        self.dates = None
+
+    def _rebuild(self, filtered_data):
+        self.ax.clear()
+        indices = range(len(filtered_data["dates"]))
+        # Plot each exercise type separately
+        self.containers = [
+            self.ax.bar([i + offset * self.bar_width for i in indices], filtered_data[key], width=self.bar_width, label=label)
+            for offset, (key, label) in zip((-1, 0, 1), self.series)
+        ]
+        self.ax.set_xlabel('Date and Time')
+        self.ax.set_ylabel('Number of exercises')
+        self.ax.set_title('Exercises Over Time')
+        self.ax.set_xticks(indices)
+        self.ax.legend()
+        self.dates = None
+
+    def show(self, filtered_data):
+        dates = filtered_data["dates"]
+        if self.containers is None or len(self.containers[0]) != len(dates):
+            self._rebuild(filtered_data)
+        else:
+            for container, (key, _) in zip(self.containers, self.series):
+                for bar, height in zip(container, filtered_data[key]):
+                    bar.set_height(height)
+        if dates != self.dates:
+            self.ax.set_xticklabels(dates, rotation=45, ha='right')
+            self.dates = list(dates)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+def compute_chart_data(interval, start=None, end=None):
+    # Runs on the chart worker thread
+    rollup.update_from_store(store)
+    key = (interval, start, end, rollup.version, datetime.now().date())
+    if key in chart_cache:
+        chart_cache.move_to_end(key)
+        return chart_cache[key]
+    filtered_data = filter_data(rollup, interval, start, end)
+    chart_cache[key] = filtered_data
+    while len(chart_cache) > CHART_CACHE_SIZE:
+        chart_cache.popitem(last=False)
+    return filtered_data
+
+def update_chart():
+    selected_interval = filter_var.get()
+    start = end = None
+    if selected_interval == "Custom Range":
+        try:
+            start, end = date.fromisoformat(start_var.get().strip()), date.fromisoformat(end_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Enter the custom range as two dates in YYYY-MM-DD format.")
+            return
+        start, end = min(start, end), max(start, end)
+    future = chart_worker.submit(compute_chart_data, selected_interval, start, end)
+    future.add_done_callback(chart_results.put)
+
+def poll_chart_results():
+    latest = None
+    while True:
+        try:
+            latest = chart_results.get_nowait()
+        except queue.Empty:
+            break
+    if latest is not None:
+        if latest.exception() is not None:
+            messagebox.showerror("Error", f"Error updating chart: {latest.exception()}")
+        else:
+            chart_view.show(latest.result())
+    root.after(50, poll_chart_results)
+
+def poll_detection_worker():
+    # Session results arrive from the detection worker instead of being re-read from disk
+    for kind, payload in detection_worker.poll():
+        if kind == "ready":
+            status_var.set(f"Models ready ({payload}). Click Run to start a session.")
+        elif kind == "started":
+            status_var.set("Session running. Press q in the camera window to finish.")
+        elif kind == "finished":
+            status_var.set("Session finished. Click Run to start another one.")
+            messagebox.showinfo("Latest Exercise Counts", format_sessions([(payload["recorded_at"], payload["counts"])]))
+            update_chart()
+        elif kind == "error":
+            if detection_worker.crashed:
+                status_var.set("The detection worker stopped; restart the dashboard to run sessions again.")
+            else:
+                status_var.set("Detection failed; see the error message.")
+            messagebox.showerror("Error", f"Error running detection: {payload}")
+    run_button.config(state=tk.DISABLED if detection_worker.busy or detection_worker.crashed else tk.NORMAL)
+    root.after(100, poll_detection_worker)
 
 def run_button_clicked():
-    if not main_script_executed:
-        threading.Thread(target=run_main_script).start()
+    if not detection_worker.busy:
+        if not detection_worker.ready:
+            status_var.set("Loading models; the session will start as soon as they are ready.")
+        detection_worker.run_session()
+        run_button.config(state=tk.DISABLED)
 
 def quit_button_clicked():
     if messagebox.askokcancel("Quit", "Are you sure you want to quit?"):
@@ -179,10 +173,11 @@ def create_gui():
     global root
     root = tk.Tk()
     root.title("Run Main Script")
-    global main_script_executed
-    main_script_executed = False
 
-    label = tk.Label(root, text="Click the button to run the main script.")
+    global status_var
+    status_var = StringVar(root)
+    status_var.set("Loading models in the background...")
+    label = tk.Label(root, textvariable=status_var)
     label.pack(pady=10)
 
     global run_button
@@ -195,9 +190,20 @@ def create_gui():
     global filter_var
     filter_var = StringVar(root)
     filter_var.set("Filter Interval")
-    filter_dropdown = ttk.Combobox(root, textvariable=filter_var, values=["Today", "Every Week of the Month", "Every Month of Year"])
+    filter_dropdown = ttk.Combobox(root, textvariable=filter_var, values=["Today", "Every Week of the Month", "Every Month of Year", "Custom Range"])
     filter_dropdown.pack(pady=5)
 
+    # From / to dates (inclusive) for the "Custom Range" interval
+    global start_var, end_var
+    range_frame = tk.Frame(root)
+    range_frame.pack(pady=5)
+    start_var = StringVar(root)
+    end_var = StringVar(root, value=datetime.now().strftime("%Y-%m-%d"))
+    tk.Label(range_frame, text="From").pack(side=tk.LEFT)
+    tk.Entry(range_frame, textvariable=start_var, width=12).pack(side=tk.LEFT, padx=5)
+    tk.Label(range_frame, text="To").pack(side=tk.LEFT)
+    tk.Entry(range_frame, textvariable=end_var, width=12).pack(side=tk.LEFT, padx=5)
+
     filter_button = tk.Button(root, text="Filter", command=update_chart)
     filter_button.pack(pady=5)
     
@@ -209,8 +215,22 @@ def create_gui():
     chart_tab = ttk.Frame(notebook)
     notebook.add(chart_tab, text='Chart')
 
+    global chart_view
+    chart_view = ChartView(chart_tab)
+    root.after(50, poll_chart_results)
+    root.after(100, poll_detection_worker)
+
     root.mainloop()
 
 if __name__ == "__main__":
-    parsed_data = parse_data_from_file("exercise_count.txt")
+    store = open_store(check_same_thread=False)
+    rollup = DailyRollup.from_store(store)
+    chart_cache = OrderedDict()
+    chart_results = queue.Queue()
+    chart_worker = ThreadPoolExecutor(max_workers=1)
+    # Start loading the pose model and LSTM while the dashboard is idle
+    detection_worker = DetectionWorker(sys.argv[1:]).start()
     create_gui()
+    detection_worker.stop()
+    chart_worker.shutdown(wait=False)
+    store.close()
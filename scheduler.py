@@ -0,0 +1,109 @@
+# Motion-gated, ROI-cropped pose inference
+import cv2
+import numpy as np
+from counting import pose_keypoints
+from tracking import pose_boxes
+
+class AdaptiveInferenceScheduler:
+    # Called with a BGR frame, returns (people, 17, 2) keypoints in frame coordinates.
+    # Frames that barely differ from the last inferred frame skip the model and return the
+    # last inferred keypoints unchanged (a still scene has still joints); while someone is tracked
+    # the model only sees a crop around their previous keypoints, with a full-frame
+    # pass every `full_frame_interval` frames or whenever the crop loses the person.
+    def __init__(self, model, enabled=True, motion_threshold=0.01, max_skip=4, crop_margin=0.25,
+                 max_crop_fraction=0.6, full_frame_interval=30, motion_width=64):
+        self.model = model
+        self.enabled = enabled
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.crop_margin = crop_margin
+        self.max_crop_fraction = max_crop_fraction
+        self.full_frame_interval = full_frame_interval
+        self.motion_width = motion_width
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.last_key_points = None
+        self.skipped_in_row = 0
+        self.since_full_frame = 0
+        self.frames = 0
+        self.skipped = 0
+        self.cropped = 0
+        self.full = 0
+
+    def _motion(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.motion_width, max(1, self.motion_width * height // width)), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.reference is None:
+            return small, np.inf
+        return small, float(cv2.absdiff(small, self.reference).mean()) / 255.0
+
+    def _crop_box(self, frame):
+        boxes = pose_boxes(self.last_key_points)
+        boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+        if len(boxes) == 0:
+            return None
+        height, width = frame.shape[:2]
+        x1, y1 = boxes[:, :2].min(axis=0)
+        x2, y2 = boxes[:, 2:].max(axis=0)
+        margin_x = (x2 - x1) * self.crop_margin
+        margin_y = (y2 - y1) * self.crop_margin
+        x1, y1 = int(max(0, x1 - margin_x)), int(max(0, y1 - margin_y))
+        x2, y2 = int(min(width, x2 + margin_x)), int(min(height, y2 + margin_y))
+        if (x2 - x1) * (y2 - y1) > self.max_crop_fraction * width * height:
+            return None
+        return x1, y1, x2, y2
+
+    def _infer(self, image):
+        return pose_keypoints(self.model(image, verbose=False)[0])
+
+    def __call__(self, frame):
+        self.frames += 1
+        if not self.enabled:
+            self.full += 1
+            return self._infer(frame)
+
+        small, motion = self._motion(frame)
+        if (motion < self.motion_threshold and self.last_key_points is not None
+                and len(self.last_key_points) and self.skipped_in_row < self.max_skip):
+            self.skipped += 1
+            self.skipped_in_row += 1
+            self.since_full_frame += 1
+            return self.last_key_points
+
+        self.reference = small
+        self.skipped_in_row = 0
+        box = None
+        if self.last_key_points is not None and len(self.last_key_points) and self.since_full_frame < self.full_frame_interval:
+            box = self._crop_box(frame)
+
+        key_points = None
+        if box is not None:
+            x1, y1, x2, y2 = box
+            key_points = self._infer(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+            if len(key_points):
+                offset = np.array([x1, y1], dtype=np.float32)
+                visible = np.any(key_points != 0, axis=-1, keepdims=True)
+                key_points = np.where(visible, key_points + offset, 0).astype(np.float32)
+                self.cropped += 1
+                self.since_full_frame += 1
+            else:
+                key_points = None
+
+        if key_points is None:
+            key_points = self._infer(frame)
+            self.full += 1
+            self.since_full_frame = 0
+        self.last_key_points = key_points
+        return key_points
+
+    def stats(self):
+        frames = max(self.frames, 1)
+        return {
+            "frames": self.frames,
+            "skipped_fraction": self.skipped / frames,
+            "cropped_fraction": self.cropped / frames,
+            "full_frame_fraction": self.full / frames,
+        }
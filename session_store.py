@@ -0,0 +1,170 @@
+# SQLite-backed store of exercise sessions with per-day totals
+import os
+import sqlite3
+from datetime import datetime, date
+import numpy as np
+from log_parser import load_log
+
+DEFAULT_PATH = "exercise_count.db"
+LEGACY_LOG = "exercise_count.txt"
+# column name in exercise_count.txt -> exercise name used by the counters
+LOG_COLUMNS = {"push-ups": "pushup", "squats": "squat", "sit-ups": "situp"}
+# column name in exercise_count.txt -> array name returned by log_parser.load_log
+LOG_ARRAYS = {"push-ups": "push_ups", "squats": "squats", "sit-ups": "sit_ups"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_day ON sessions (day);
+CREATE TABLE IF NOT EXISTS session_counts (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    exercise TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session_id, exercise)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, exercise)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def parse_log_line(line):
+    date_str, *count_strs = line.strip().split(", ")
+    recorded_at = datetime.strptime(date_str, "%A %m/%d/%y %I:%M %p")
+    counts = {}
+    for count_str in count_strs:
+        count, column = count_str.split(" ", 1)
+        counts[LOG_COLUMNS.get(column, column)] = int(count)
+    return recorded_at, counts
+
+class SessionStore:
+    def __init__(self, path=DEFAULT_PATH, check_same_thread=True):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _insert(self, sessions):
+        cursor = self.connection.cursor()
+        for recorded_at, counts in sessions:
+            day = recorded_at.date().isoformat()
+            cursor.execute("INSERT INTO sessions (recorded_at, day) VALUES (?, ?)", (recorded_at.isoformat(timespec="seconds"), day))
+            session_id = cursor.lastrowid
+            cursor.executemany("INSERT INTO session_counts (session_id, exercise, count) VALUES (?, ?, ?)",
+                               [(session_id, exercise, count) for exercise, count in counts.items()])
+            cursor.executemany("INSERT INTO daily_totals (day, exercise, count) VALUES (?, ?, ?) "
+                               "ON CONFLICT (day, exercise) DO UPDATE SET count = count + excluded.count",
+                               [(day, exercise, count) for exercise, count in counts.items()])
+        return cursor.lastrowid
+
+    def add_session(self, counts, recorded_at=None, key=None):
+        # With a key the session is only added once, so replaying a crash checkpoint is safe
+        with self.connection:
+            if key is not None:
+                if self.connection.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                    return None
+                self.connection.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, datetime.now().isoformat(timespec="seconds")))
+            return self._insert([(recorded_at or datetime.now(), counts)])
+
+    def day_totals(self, day):
+        if isinstance(day, (date, datetime)):
+            day = day.strftime("%Y-%m-%d")
+        rows = self.connection.execute("SELECT exercise, count FROM daily_totals WHERE day = ?", (day,))
+        return dict(rows.fetchall())
+
+    def today_totals(self):
+        return self.day_totals(date.today())
+
+    def daily_totals(self, start=None, end=None):
+        # [(day, {exercise: count})] ordered by day, optionally limited to start <= day <= end
+        query = "SELECT day, exercise, count FROM daily_totals"
+        params = []
+        if start is not None or end is not None:
+            query += " WHERE day BETWEEN ? AND ?"
+            params = [str(start or "0000-00-00"), str(end or "9999-99-99")]
+        totals = {}
+        for day, exercise, count in self.connection.execute(query + " ORDER BY day", params):
+            totals.setdefault(day, {})[exercise] = count
+        return list(totals.items())
+
+    def sessions(self, start=None, end=None, limit=None, newest_first=False):
+        # [(recorded_at, {exercise: count})] ordered by time
+        query = "SELECT id, recorded_at FROM sessions"
+        params = []
+        if start is not None or end is not None:
+            query += " WHERE day BETWEEN ? AND ?"
+            params = [str(start or "0000-00-00"), str(end or "9999-99-99")]
+        query += " ORDER BY recorded_at DESC, id DESC" if newest_first else " ORDER BY recorded_at, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self.connection.execute(query, params).fetchall()
+        counts = {session_id: {} for session_id, _ in rows}
+        if rows:
+            placeholders = ",".join("?" * len(rows))
+            for session_id, exercise, count in self.connection.execute(
+                    f"SELECT session_id, exercise, count FROM session_counts WHERE session_id IN ({placeholders})",
+                    [session_id for session_id, _ in rows]):
+                counts[session_id][exercise] = count
+        return [(datetime.fromisoformat(recorded_at), counts[session_id]) for session_id, recorded_at in rows]
+
+    def latest_sessions(self, n):
+        return self.sessions(limit=n, newest_first=True)[::-1]
+
+    def _insert_columns(self, log):
+        # Bulk insert of a load_log() result with one aggregated daily_totals upsert per day
+        cursor = self.connection.cursor()
+        first_id = (cursor.execute("SELECT MAX(id) FROM sessions").fetchone()[0] or 0) + 1
+        ids = np.arange(first_id, first_id + len(log["dates"]))
+        recorded_at = np.datetime_as_string(log["dates"].astype("datetime64[s]"))
+        days = log["dates"].astype("datetime64[D]")
+        cursor.executemany("INSERT INTO sessions (id, recorded_at, day) VALUES (?, ?, ?)",
+                           zip(ids.tolist(), recorded_at.tolist(), np.datetime_as_string(days).tolist()))
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        for column, exercise in LOG_COLUMNS.items():
+            counts = log[LOG_ARRAYS[column]]
+            cursor.executemany("INSERT INTO session_counts (session_id, exercise, count) VALUES (?, ?, ?)",
+                               zip(ids.tolist(), [exercise] * len(ids), counts.tolist()))
+            totals = np.bincount(day_index, weights=counts, minlength=len(unique_days)).astype(np.int64)
+            cursor.executemany("INSERT INTO daily_totals (day, exercise, count) VALUES (?, ?, ?) "
+                               "ON CONFLICT (day, exercise) DO UPDATE SET count = count + excluded.count",
+                               zip(np.datetime_as_string(unique_days).tolist(), [exercise] * len(unique_days), totals.tolist()))
+
+    def import_text_log(self, path=LEGACY_LOG):
+        # One-time import of the old text log; later calls are no-ops
+        key = "imported:" + os.path.abspath(path)
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        log = load_log(path) if os.path.exists(path) else None
+        with self.connection:
+            if log is not None:
+                self._insert_columns(log)
+            self.connection.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, datetime.now().isoformat(timespec="seconds")))
+        if log is None:
+            return 0
+        for line_number, line in log["errors"]:
+            print(f"Skipped malformed line {line_number} in {path}: {line}")
+        return len(log["dates"])
+
+def open_store(path=DEFAULT_PATH, legacy_log=LEGACY_LOG, check_same_thread=True):
+    store = SessionStore(path, check_same_thread)
+    store.import_text_log(legacy_log)
+    return store
@@ -1,254 +1,237 @@
 import os
 import cv2
-import torch
 import numpy as np
-import math
 import json
 import datetime
+import logging
 import argparse
 import subprocess
 import pygame
-from ultralytics import YOLO
-from for_detect.Inference import LSTM
-
-sport_list = {
-    'situp': {
-        'left_points_idx': [6, 12, 14],
-        'right_points_idx': [5, 11, 13],
-        'maintaining': 70,
-        'relaxing': 110,
-        'concerned_key_points_idx': [5, 6, 11, 12, 13, 14],
-        'concerned_skeletons_idx': [[14, 12], [15, 13], [6, 12], [7, 13]]
-    },
-    'pushup': {
-        'left_points_idx': [6, 8, 10],
-        'right_points_idx': [5, 7, 9],
-        'maintaining': 140,
-        'relaxing': 120,
-        'concerned_key_points_idx': [5, 6, 7, 8, 9, 10],
-        'concerned_skeletons_idx': [[9, 11], [7, 9], [6, 8], [8, 10]]
-    },
-    'squat': {
-        'left_points_idx': [11, 13, 15],
-        'right_points_idx': [12, 14, 16],
-        'maintaining': 80,
-        'relaxing': 140,
-        'concerned_key_points_idx': [11, 12, 13, 14, 15, 16],
-        'concerned_skeletons_idx': [[16, 14], [14, 12], [17, 15], [15, 13]]
-    }
-}
-
-def calculate_angle(key_points, left_points_idx, right_points_idx):
-    def _calculate_angle(line1, line2):
-        slope1 = math.atan2(line1[3] - line1[1], line1[2] - line1[0])
-        slope2 = math.atan2(line2[3] - line2[1], line2[2] - line2[0])
-        angle1 = math.degrees(slope1)
-        angle2 = math.degrees(slope2)
-        angle_diff = abs(angle1 - angle2)
-        if angle_diff > 180:
-            angle_diff = 360 - angle_diff
-        return angle_diff
-
-    left_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in left_points_idx]
-    right_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in right_points_idx]
-
-    line1_left = [left_points[1][0], left_points[1][1], left_points[0][0], left_points[0][1]]
-    line2_left = [left_points[1][0], left_points[1][1], left_points[2][0], left_points[2][1]]
-    angle_left = _calculate_angle(line1_left, line2_left)
-
-    line1_right = [right_points[1][0], right_points[1][1], right_points[0][0], right_points[0][1]]
-    line2_right = [right_points[1][0], right_points[1][1], right_points[2][0], right_points[2][1]]
-    angle_right = _calculate_angle(line1_right, line2_right)
-
-    angle = (angle_left + angle_right) / 2
-    return angle
-
-def main():
+from backends import BACKENDS, load_pose_model, load_detector
+from for_detect.streaming import StreamingClassifier, TrackClassifiers
+from counting import sport_list, CountingEngine, HYSTERESIS
+from tracking import PoseTracker
+from scheduler import AdaptiveInferenceScheduler
+from session_store import open_store
+from persistence import SessionCheckpointer, recover_checkpoints
+from pipeline import FramePipeline, sequential_frames, default_drop_policy, DROP_LATEST, DROP_NEVER
+from profiling import StageProfiler, setup_logging
+from overlay import OverlayRenderer
+
+log = logging.getLogger("detection")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default=r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\video\pushup2.mp4',
+                        help='video file path or camera index')
+    parser.add_argument('--pipeline', action='store_true', help='run capture, inference and rendering as separate stages')
+    parser.add_argument('--drop-policy', choices=[DROP_LATEST, DROP_NEVER], default=None,
+                        help='frame drop policy between stages (default: latest for cameras, never for files)')
+    parser.add_argument('--queue-size', type=int, default=2, help='maximum depth of each stage queue')
+    parser.add_argument('--multi-person', action='store_true', help='track every detected person with their own counters')
+    parser.add_argument('--adaptive', action='store_true', help='skip pose inference on still frames and crop around the tracked person')
+    parser.add_argument('--backend', choices=['auto'] + list(BACKENDS), default='auto', help='pose model runtime')
+    parser.add_argument('--int8', action='store_true', help='use an int8-quantized pose model / LSTM where the backend supports it')
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads for CPU inference')
+    parser.add_argument('--no-classifier', action='store_true', help='run every exercise counter instead of only the one the LSTM predicts')
+    parser.add_argument('--classify-every', type=int, default=5, help='frames between exercise predictions')
+    parser.add_argument('--classify-window', type=int, default=5, help='frames each exercise prediction is made from (the detector was trained on 5)')
+    parser.add_argument('--display-scale', type=float, default=1.0, help='resize frames by this factor before drawing and showing them')
+    parser.add_argument('--no-skeleton', dest='skeleton', action='store_false', help='do not draw the active exercise\'s skeleton')
+    parser.add_argument('--checkpoint-interval', type=float, default=2.0, help='seconds between background checkpoints of the session counts')
+    parser.add_argument('--no-fsync', action='store_true', help='do not fsync checkpoints (faster on slow disks, less crash-safe)')
+    parser.add_argument('--profile', action='store_true', help='time each stage of the loop and print a summary at exit')
+    parser.add_argument('--stats-overlay', action='store_true', help='show FPS and per-stage latencies on screen (implies --profile)')
+    parser.add_argument('--stats-output', default=None, help='write the stage timings to this .json or .csv file at exit (implies --profile)')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='DEBUG also logs maintained / relaxed transitions')
+    parser.add_argument('--log-interval', type=float, default=1.0, help='minimum seconds between repeats of the same log message')
+    return parser.parse_args(argv)
+
+def goal_lines(engine, total_counts, daily_goals):
+    text_lines = []
+    for name, label in zip(engine.names, engine.labels):
+        if total_counts[name] >= daily_goals[name]:
+            text_lines.append(f"{label}: {total_counts[name]}/{daily_goals[name]} - Completed!")
+        else:
+            text_lines.append(f"{label}: {total_counts[name]}/{daily_goals[name]}")
+    return text_lines
+
+def load_models(args):
+    # Everything that is slow to set up and can be reused between sessions
+    # (the dashboard keeps one of these warm in its detection worker)
+    setup_logging(args.log_level, args.log_interval)
+
     # Initialize pygame mixer
     pygame.mixer.init()
+    sounds = {name: pygame.mixer.Sound(r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\sound\ding.mp3') for name in sport_list}
 
-    # Load push-up, squat, and sit-up counts from the file for the current day, if available
-    current_date = datetime.datetime.now().strftime("%m/%d/%y")
-    pushup_counter = 0
-    squat_counter = 0
-    situp_counter = 0
-    total_pushup_count = 0
-    total_squat_count = 0
-    total_situp_count = 0
-    daily_pushup_goal = 100
-    daily_squat_goal = 100
-    daily_situp_goal = 100
-
-    if os.path.exists("exercise_count.txt") and os.stat("exercise_count.txt").st_size != 0:
-        with open("exercise_count.txt", "r") as file:
-            for line in file:
-                line_parts = line.split(", ")
-                if len(line_parts) >= 4:
-                    line_date = line_parts[0].split(" ")[1]
-                    if current_date == line_date:
-                        if "push-ups" in line_parts[1]:
-                            total_pushup_count += int(line_parts[1].split(" ")[0])
-                        if "squats" in line_parts[2]:
-                            total_squat_count += int(line_parts[2].split(" ")[0])
-                        if "sit-ups" in line_parts[3]:
-                            total_situp_count += int(line_parts[3].split(" ")[0])
-
-    print("Total push-up count for today:", total_pushup_count)
-    print("Total squat count for today:", total_squat_count)
-    print("Total sit-up count for today:", total_situp_count)
-
-    model_path = 'model/yolov8s-pose.engine'
+    model_path = 'model/yolov8s-pose'
     detector_model_path = './for_detect/checkpoint/best_model.pt'
-    input_video_path = r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\video\pushup2.mp4'
-    exit_key = "q"
-    model = YOLO(model_path)
+    model, backend = load_pose_model(model_path, args.backend, args.int8, args.threads)
+    print("Pose model backend:", backend)
 
     with open(os.path.join(os.path.dirname(detector_model_path), 'idx_2_category.json'), 'r') as f:
         idx_2_category = json.load(f)
-    detect_model = LSTM(17*2, 8, 2, 3, model.device)
-    model_weight = torch.load(detector_model_path)
-    detect_model.load_state_dict(model_weight)
+    detector_device = 'cuda' if backend == 'tensorrt' else 'cpu'
+    detect_model = load_detector(detector_model_path, detector_device, quantize=args.int8)
+    return {"model": model, "backend": backend, "detect_model": detect_model, "idx_2_category": idx_2_category, "sounds": sounds}
+
+def run_session(args, models):
+    # One exercise session; returns the session's counts once they are saved
+    profiler = StageProfiler(enabled=args.profile or args.stats_overlay or args.stats_output is not None)
+
+    # Load today's counts from the session store (importing exercise_count.txt on first use)
+    store = open_store()
+    # A checkpoint whose process is gone means that session never finished; keep its reps
+    for recovered in recover_checkpoints(store):
+        print("Recovered counts from an unfinished session:", recovered)
+    today_totals = store.today_totals()
+    total_counts = {name: today_totals.get(name, 0) for name in sport_list}
+    daily_goals = {name: 100 for name in sport_list}
+
+    for name, sport in sport_list.items():
+        print(f"Total {sport['label'].lower()} count for today:", total_counts[name])
+
+    input_video_path = args.source
+    pipelined = args.pipeline
+    drop_policy = args.drop_policy or default_drop_policy(input_video_path)
+    exit_key = "q"
+    model = models["model"]
+    detect_model = models["detect_model"]
+    idx_2_category = models["idx_2_category"]
+
+    classifier = None
+    if not args.no_classifier:
+        # In multi-person mode each track gets its own classifier; detection order changes between frames
+        classifier_type = TrackClassifiers if args.multi_person else StreamingClassifier
+        classifier = classifier_type(detect_model, idx_2_category, window=args.classify_window, every=args.classify_every)
 
     if input_video_path.isnumeric():
         cap = cv2.VideoCapture(int(input_video_path))
     else:
         cap = cv2.VideoCapture(input_video_path)
 
-    reaching_pushup = False
-    reaching_squat = False
-    reaching_situp = False
-    reaching_last_pushup = False
-    reaching_last_squat = False
-    reaching_last_situp = False
-    state_keep_pushup = False
-    state_keep_squat = False
-    state_keep_situp = False
-    prev_angle_pushup = None
-    prev_angle_squat = None
-    prev_angle_situp = None
-
-    maintaining_threshold_pushup = sport_list['pushup']['maintaining']
-    relaxing_threshold_pushup = sport_list['pushup']['relaxing']
-    maintaining_threshold_squat = sport_list['squat']['maintaining']
-    relaxing_threshold_squat = sport_list['squat']['relaxing']
-    maintaining_threshold_situp = sport_list['situp']['maintaining']
-    relaxing_threshold_situp = sport_list['situp']['relaxing']
-    hysteresis = 48.7
-
-    pushup_sound = pygame.mixer.Sound(r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\sound\ding.mp3')
-    squat_sound = pygame.mixer.Sound(r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\sound\ding.mp3')
-    situp_sound = pygame.mixer.Sound(r'C:\Users\CTRL C and CTRL V\Documents\bitacademy\Project\motivation software app\detection\sound\ding.mp3')
-
-    while cap.isOpened():
-        success, frame = cap.read()
-
-        if success:
-            results = model(frame)
-
-            if results[0].keypoints.shape[1] == 0:
-                continue
-
-            angle_pushup = calculate_angle(results[0].keypoints, sport_list['pushup']['left_points_idx'], sport_list['pushup']['right_points_idx'])
-            angle_squat = calculate_angle(results[0].keypoints, sport_list['squat']['left_points_idx'], sport_list['squat']['right_points_idx'])
-            angle_situp = calculate_angle(results[0].keypoints, sport_list['situp']['left_points_idx'], sport_list['situp']['right_points_idx'])
-
-            if angle_pushup < maintaining_threshold_pushup - hysteresis:
-                print("Pushup maintained")
-                reaching_pushup = True
-            elif angle_pushup > relaxing_threshold_pushup + hysteresis:
-                print("Pushup relaxed")
-                reaching_pushup = False
-
-            if reaching_pushup != reaching_last_pushup:
-                reaching_last_pushup = reaching_pushup
-                if reaching_pushup:
-                    state_keep_pushup = True
-                elif not reaching_pushup and state_keep_pushup:
-                    if prev_angle_pushup is not None and prev_angle_pushup > relaxing_threshold_pushup:
-                        pushup_counter += 1
-                        total_pushup_count += 1
-                        pushup_sound.play()
-                    state_keep_pushup = False
-            prev_angle_pushup = angle_pushup
-
-            if angle_squat < maintaining_threshold_squat - hysteresis:
-                print("Squat maintained")
-                reaching_squat = True
-            elif angle_squat > relaxing_threshold_squat + hysteresis:
-                print("Squat relaxed")
-                reaching_squat = False
-
-            if reaching_squat != reaching_last_squat:
-                reaching_last_squat = reaching_squat
-                if reaching_squat:
-                    state_keep_squat = True
-                elif not reaching_squat and state_keep_squat:
-                    if prev_angle_squat is not None and prev_angle_squat > relaxing_threshold_squat:
-                        squat_counter += 1
-                        total_squat_count += 1
-                        squat_sound.play()
-                    state_keep_squat = False
-            prev_angle_squat = angle_squat
-
-            if angle_situp < maintaining_threshold_situp - hysteresis:
-                print("Sit-up maintained")
-                reaching_situp = True
-            elif angle_situp > relaxing_threshold_situp + hysteresis:
-                print("Sit-up relaxed")
-                reaching_situp = False
-
-            if reaching_situp != reaching_last_situp:
-                reaching_last_situp = reaching_situp
-                if reaching_situp:
-                    state_keep_situp = True
-                elif not reaching_situp and state_keep_situp:
-                    if prev_angle_situp is not None and prev_angle_situp > relaxing_threshold_situp:
-                        situp_counter += 1
-                        total_situp_count += 1
-                        situp_sound.play()
-                    state_keep_situp = False
-            prev_angle_situp = angle_situp
-
-            text_lines = []
-            if total_pushup_count >= daily_pushup_goal:
-                text_lines.append(f"Push-ups: {total_pushup_count}/{daily_pushup_goal} - Completed!")
-            else:
-                text_lines.append(f"Push-ups: {total_pushup_count}/{daily_pushup_goal}")
+    if args.multi_person:
+        engine = PoseTracker(sport_list, HYSTERESIS)
+    else:
+        engine = CountingEngine(sport_list, HYSTERESIS)
+    sounds = [models["sounds"][name] for name in engine.names]
+    checkpointer = SessionCheckpointer(interval=args.checkpoint_interval, fsync=not args.no_fsync).start()
 
-            if total_squat_count >= daily_squat_goal:
-                text_lines.append(f"Squats: {total_squat_count}/{daily_squat_goal} - Completed!")
-            else:
-                text_lines.append(f"Squats: {total_squat_count}/{daily_squat_goal}")
+    scheduler = AdaptiveInferenceScheduler(model, enabled=args.adaptive)
+    if pipelined:
+        frames = FramePipeline(cap, scheduler, drop_policy=drop_policy, queue_size=args.queue_size, profiler=profiler).start()
+    else:
+        frames = sequential_frames(cap, scheduler, profiler)
+
+    overlay = OverlayRenderer(sport_list, scale=args.display_scale)
+    goal_text = goal_lines(engine, total_counts, daily_goals)
+    text2 = f"Press: {exit_key} to quit"
+    stats_lines = []
+    finished = False
+    try:
+        for frame, key_points in frames:
+            profiler.frame_done()
+            if len(key_points) == 0:
+                continue
 
-            if total_situp_count >= daily_situp_goal:
-                text_lines.append(f"Sit-ups: {total_situp_count}/{daily_situp_goal} - Completed!")
+            active = None
+            if args.multi_person:
+                with profiler.stage("tracking"):
+                    track_ids = engine.assign(key_points)
+                    if classifier is not None:
+                        classifier.push(track_ids, key_points)
+                        active = classifier.active_mask(track_ids, engine.names)
+                    counted = engine.count(active).sum(axis=0)
+                    if classifier is not None:
+                        classifier.prune(engine.ids)
+                        # the skeleton shows every exercise someone in view is doing
+                        active = active.any(axis=0)
             else:
-                text_lines.append(f"Sit-ups: {total_situp_count}/{daily_situp_goal}")
-
-            text2 = f"Press: {exit_key} to quit"
-
-            for i, line in enumerate(text_lines):
-                cv2.putText(frame, line, (20, 50 + i * 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.putText(frame, text2, (20, 50 + len(text_lines) * 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-            cv2.imshow("Exercise Cam", frame)
-
-            key = cv2.waitKey(1)
+                if classifier is not None:
+                    classifier.push(key_points[0])
+                    active = classifier.active_mask(engine.names)
+                with profiler.stage("angles"):
+                    angles = engine.angles(key_points[0], active)
+                with profiler.stage("state"):
+                    counted = engine.step(angles, active)
+            if log.isEnabledFor(logging.DEBUG):
+                for i in np.flatnonzero(engine.maintained):
+                    log.debug("%s maintained", engine.labels[i])
+                for i in np.flatnonzero(engine.relaxed):
+                    log.debug("%s relaxed", engine.labels[i])
+            for i in np.flatnonzero(counted):
+                total_counts[engine.names[i]] += int(counted[i])
+                sounds[i].play()
+            if counted.any():
+                checkpointer.update(engine.counts())
+
+            with profiler.stage("overlay"):
+                if counted.any():
+                    goal_text = goal_lines(engine, total_counts, daily_goals)
+                text_lines = goal_text + [text2]
+
+                # Queue, schedule and stage stats change every frame; they go in the separately cached
+                # footer, refreshed every 15 frames, so the goal text is only redrawn when counts change
+                if profiler.frames % 15 == 0 or not stats_lines:
+                    stats_lines = []
+                    if pipelined:
+                        depths = frames.queue_depths()
+                        stats_lines.append(f"Queues: capture {depths['capture']}, inference {depths['inference']}")
+                    if args.adaptive:
+                        schedule = scheduler.stats()
+                        stats_lines.append(f"Skipped: {schedule['skipped_fraction']:.0%}, cropped: {schedule['cropped_fraction']:.0%}")
+                    if profiler.enabled and args.stats_overlay:
+                        if pipelined:
+                            profiler.dropped = frames.dropped()
+                        stats_lines += profiler.overlay_lines()
+                display = overlay.render(frame, text_lines, key_points if args.skeleton else None, active, stats_lines)
+                if args.multi_person:
+                    for track in engine.tracks():
+                        track_text = f"#{track['id']} " + " ".join(str(count) for count in track['counts'].values())
+                        cv2.putText(display, track_text, overlay.scale_point(track['center']), cv2.FONT_HERSHEY_SIMPLEX, 0.8 * args.display_scale, (255, 255, 0), 2)
+
+            with profiler.stage("display"):
+                cv2.imshow("Exercise Cam", display)
+                key = cv2.waitKey(1)
             if key & 0xFF == ord(exit_key):
-                current_time = datetime.datetime.now().strftime("%A %x %I:%M %p")
-                with open("exercise_count.txt", "a") as file:
-                    file.write(f"{current_time}, {pushup_counter} push-ups, {squat_counter} squats, {situp_counter} sit-ups\n")
                 break
-            
-            if total_pushup_count >= daily_pushup_goal and total_squat_count >= daily_squat_goal and total_situp_count >= daily_situp_goal:
-                print("Challenge Complete!")
-        else:
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-
+        
+            if all(total_counts[name] >= daily_goals[name] for name in sport_list):
+                log.info("Challenge Complete!")
+
+        # Reached on the exit key and when the video ends
+        checkpointer.finish(store, engine.counts())
+        finished = True
+    finally:
+        # Also on errors: the detection worker runs the next session in this same process
+        if not finished:
+            # The checkpoint stays behind and is recovered by the next session
+            checkpointer.abandon()
+        if pipelined:
+            frames.stop()
+        cap.release()
+        cv2.destroyAllWindows()
+        store.close()
+
+    if pipelined:
+        profiler.dropped = frames.dropped()
+        print("Pipeline stats:", frames.stats())
+    if profiler.enabled:
+        for line in profiler.overlay_lines():
+            print(line)
+        if args.stats_output:
+            profiler.export(args.stats_output)
+            print("Stage timings written to", args.stats_output)
+    if args.multi_person:
+        print("Per-person totals for today:", engine.track_totals())
+    print("Inference schedule:", scheduler.stats())
+    return {"counts": engine.counts(), "recorded_at": datetime.datetime.now()}
+
+def main(args):
+    run_session(args, load_models(args))
     subprocess.Popen(["python", "exercise_count_message.py"])
 
 if __name__ == '__main__':
-    main()
+    main(parse_args())
@@ -0,0 +1,107 @@
+# Batched search for rep counter thresholds over recorded keypoint sequences
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from counting import sport_list, CounterState, build_points_idx, joint_angles, step_counters, HYSTERESIS
+from keypoint_cache import KeypointCache, file_hash, DEFAULT_DIR
+from for_detect.sequences import read_keypoint_csv
+
+def parse_range(text):
+    # "start:stop:step" (inclusive stop) or a single value
+    parts = [float(part) for part in text.split(":")]
+    if len(parts) == 1:
+        return np.array(parts, dtype=np.float32)
+    start, stop, step = parts
+    return np.arange(start, stop + step / 2, step, dtype=np.float32)
+
+def make_grid(maintaining, relaxing, hysteresis):
+    # (combinations,) arrays in (hysteresis, maintaining, relaxing) C order
+    h, m, r = np.meshgrid(hysteresis, maintaining, relaxing, indexing="ij")
+    return m.ravel(), r.ravel(), h.ravel()
+
+def load_sequence(path, cache=None, cache_tag=None):
+    if path.endswith(".csv"):
+        return read_keypoint_csv(path)
+    cached = cache.load(file_hash(path), cache_tag) if cache is not None else None
+    if cached is None:
+        raise FileNotFoundError(f"No cached keypoints for {path}; run batch_analysis.py on it first")
+    # counting only sees frames with a detection, and only the first person
+    return np.array([frame[0] for frame in cached[0] if len(frame)], dtype=np.float32).reshape(-1, 17, 2)
+
+def sweep_sequence(key_points, exercise, maintaining, relaxing, hysteresis):
+    # Rep counts for every threshold combination on one sequence; the only Python loop is over frames
+    angles = joint_angles(key_points, build_points_idx({exercise: sport_list[exercise]}))[:, 0]
+    state = CounterState(maintaining.shape)
+    for angle in angles:
+        step_counters(state, angle, maintaining, relaxing, hysteresis)
+    return state.count
+
+def _sweep_task(task):
+    path, exercise, grid, cache_dir, cache_tag = task
+    cache = KeypointCache(cache_dir) if cache_dir else None
+    return sweep_sequence(load_sequence(path, cache, cache_tag), exercise, *grid)
+
+def sweep(labels, maintaining, relaxing, hysteresis, workers=None, cache_dir=None, cache_tag=None):
+    # labels: {path: {"exercise": name, "reps": true count}}
+    grid = make_grid(maintaining, relaxing, hysteresis)
+    shape = (len(hysteresis), len(maintaining), len(relaxing))
+    paths = list(labels)
+    tasks = [(path, labels[path]["exercise"], grid, cache_dir, cache_tag) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = dict(zip(paths, pool.map(_sweep_task, tasks)))
+
+    errors = {}
+    for path in paths:
+        exercise = labels[path]["exercise"]
+        error = np.abs(counts[path] - labels[path]["reps"]).reshape(shape)
+        errors[exercise] = errors.get(exercise, 0) + error
+
+    report = {"per_exercise": {}, "shared_hysteresis": {}}
+    for exercise, error in errors.items():
+        h, m, r = np.unravel_index(np.argmin(error), shape)
+        report["per_exercise"][exercise] = {
+            "maintaining": float(maintaining[m]), "relaxing": float(relaxing[r]), "hysteresis": float(hysteresis[h]),
+            "error": int(error[h, m, r]),
+            "counts": {path: int(counts[path].reshape(shape)[h, m, r]) for path in paths if labels[path]["exercise"] == exercise},
+        }
+
+    # The app uses one hysteresis for all exercises: pick the value with the lowest
+    # total error when every exercise uses its own best thresholds at that value.
+    best_per_h = {exercise: error.reshape(len(hysteresis), -1).min(axis=1) for exercise, error in errors.items()}
+    h = int(np.argmin(sum(best_per_h.values())))
+    report["shared_hysteresis"]["hysteresis"] = float(hysteresis[h])
+    for exercise, error in errors.items():
+        m, r = np.unravel_index(np.argmin(error[h]), error[h].shape)
+        report["shared_hysteresis"][exercise] = {"maintaining": float(maintaining[m]), "relaxing": float(relaxing[r]), "error": int(error[h, m, r])}
+    report["combinations"] = int(np.prod(shape))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Find maintaining/relaxing/hysteresis settings that best match labeled rep counts")
+    parser.add_argument('labels', help='JSON file: {"for_detect/data/squat/001.csv": {"exercise": "squat", "reps": 12}, ...}; '
+                                       'video paths are read from the keypoint cache')
+    parser.add_argument('--maintaining', default='20:180:5', help='start:stop:step')
+    parser.add_argument('--relaxing', default='60:180:5', help='start:stop:step')
+    parser.add_argument('--hysteresis', default='0:60:4', help=f'start:stop:step (current value {HYSTERESIS})')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=DEFAULT_DIR)
+    parser.add_argument('--cache-tag', default='yolov8s-pose-torch-fp32-640',
+                        help='tag the cached video keypoints were stored under: <model>-<backend>-<fp32|int8>-<imgsz>, as printed by batch_analysis.py')
+    parser.add_argument('--output', default='threshold_sweep.json')
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        labels = json.load(f)
+    report = sweep(labels, parse_range(args.maintaining), parse_range(args.relaxing), parse_range(args.hysteresis),
+                   args.workers, args.cache_dir, args.cache_tag)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for exercise, best in report["per_exercise"].items():
+        print(f"{exercise}: maintaining {best['maintaining']}, relaxing {best['relaxing']}, "
+              f"hysteresis {best['hysteresis']} (error {best['error']})")
+    print(f"Evaluated {report['combinations']} combinations -> {os.path.abspath(args.output)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Multi-person tracking with per-track rep counters
+import datetime
+import numpy as np
+from counting import sport_list, CountingEngine, CounterState, joint_angles, step_counters, HYSTERESIS
+
+def pose_boxes(key_points):
+    # (people, 17, 2) -> (people, 4) x1, y1, x2, y2 over the detected (non-zero) keypoints
+    visible = np.any(key_points != 0, axis=-1, keepdims=True)
+    low = np.where(visible, key_points, np.inf).min(axis=1)
+    high = np.where(visible, key_points, -np.inf).max(axis=1)
+    boxes = np.concatenate([low, high], axis=1)
+    return np.where(np.isfinite(boxes), boxes, 0).astype(np.float32)
+
+def match_tracks(track_centers, track_scales, det_centers, max_distance):
+    # Greedy nearest-centroid assignment; distances are relative to each track's box size
+    if len(track_centers) == 0 or len(det_centers) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    cost = np.linalg.norm(track_centers[:, None, :] - det_centers[None, :, :], axis=-1) / track_scales[:, None]
+    order = np.argsort(cost, axis=None)
+    rows, cols = np.unravel_index(order, cost.shape)
+    keep = cost[rows, cols] <= max_distance
+    rows, cols = rows[keep], cols[keep]
+    used_tracks = np.zeros(len(track_centers), dtype=bool)
+    used_dets = np.zeros(len(det_centers), dtype=bool)
+    matched_tracks, matched_dets = [], []
+    for row, col in zip(rows, cols):
+        if not used_tracks[row] and not used_dets[col]:
+            used_tracks[row] = used_dets[col] = True
+            matched_tracks.append(row)
+            matched_dets.append(col)
+            if len(matched_tracks) == min(cost.shape):
+                break
+    return np.array(matched_tracks, dtype=np.intp), np.array(matched_dets, dtype=np.intp)
+
+class PoseTracker:
+    def __init__(self, table=sport_list, hysteresis=HYSTERESIS, max_distance=0.75, max_missed=30):
+        self.engine = CountingEngine(table, hysteresis)
+        self.names = self.engine.names
+        self.labels = self.engine.labels
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.next_id = 1
+        self.ids = np.empty(0, dtype=np.int64)
+        self.centers = np.empty((0, 2), dtype=np.float32)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.missed = np.empty(0, dtype=np.int64)
+        self.state = CounterState((0, len(self.names)))
+        self._frame = None
+        self.maintained = np.zeros(len(self.names), dtype=bool)
+        self.relaxed = np.zeros(len(self.names), dtype=bool)
+        self.day = datetime.date.today()
+        self.daily_totals = {}
+        self.session_totals = np.zeros(len(self.names), dtype=np.int64)
+
+    def assign(self, key_points):
+        # key_points: (people, 17, 2) for one frame. Matches every detection to a track (new
+        # people get a new one) and returns the track id of each detection.
+        key_points = np.asarray(key_points, dtype=np.float32)[..., :2]
+        boxes = pose_boxes(key_points)
+        det_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        det_scales = np.maximum(np.linalg.norm(boxes[:, 2:] - boxes[:, :2], axis=1), 1.0)
+
+        track_rows, det_rows = match_tracks(self.centers, self.scales, det_centers, self.max_distance)
+        new_dets = np.setdiff1d(np.arange(len(key_points)), det_rows)
+        if len(new_dets):
+            start = len(self.ids)
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(new_dets))])
+            self.next_id += len(new_dets)
+            self.centers = np.concatenate([self.centers, det_centers[new_dets]])
+            self.scales = np.concatenate([self.scales, det_scales[new_dets]])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new_dets), dtype=np.int64)])
+            self.state.append(len(new_dets))
+            track_rows = np.concatenate([track_rows, np.arange(start, start + len(new_dets))])
+            det_rows = np.concatenate([det_rows, new_dets])
+
+        self.centers[track_rows] = det_centers[det_rows]
+        self.scales[track_rows] = det_scales[det_rows]
+        self.missed += 1
+        self.missed[track_rows] = 0
+
+        self._frame = key_points, track_rows, det_rows
+        track_ids = np.empty(len(key_points), dtype=np.int64)
+        track_ids[det_rows] = self.ids[track_rows]
+        return track_ids
+
+    def count(self, active=None):
+        # Steps the counters of the tracks matched by the last assign(). active: optional
+        # (exercises,) mask for everyone or (people, exercises) mask per detection.
+        # Returns (tracks, exercises) reps counted this frame.
+        key_points, track_rows, det_rows = self._frame
+        mask = np.zeros((len(self.ids), len(self.names)), dtype=bool)
+        if active is None:
+            mask[track_rows] = True
+        else:
+            active = np.asarray(active, dtype=bool)
+            mask[track_rows] = active[det_rows] if active.ndim == 2 else active
+
+        # One angle computation and one state step for every person in the frame
+        angles = np.full((len(self.ids), len(self.names)), np.nan, dtype=np.float32)
+        exercises = mask.any(axis=0)
+        if len(det_rows) and exercises.any():
+            angles[np.ix_(track_rows, exercises)] = joint_angles(key_points[det_rows], self.engine.points_idx[exercises])
+        counted, maintained, relaxed = step_counters(self.state, angles, self.engine.maintaining, self.engine.relaxing, self.engine.hysteresis, mask)
+        self.maintained = maintained.any(axis=0)
+        self.relaxed = relaxed.any(axis=0)
+        self._add_to_totals(counted)
+
+        keep = self.missed <= self.max_missed
+        if not keep.all():
+            self.ids, self.centers, self.scales, self.missed = self.ids[keep], self.centers[keep], self.scales[keep], self.missed[keep]
+            self.state = self.state.take(keep)
+            counted = counted[keep]
+        return counted
+
+    def update(self, key_points, active=None):
+        self.assign(key_points)
+        return self.count(active)
+
+    def _add_to_totals(self, counted):
+        today = datetime.date.today()
+        if today != self.day:
+            self.day = today
+            self.daily_totals = {}
+        for row in np.flatnonzero(counted.any(axis=1)):
+            track_id = int(self.ids[row])
+            totals = self.daily_totals.setdefault(track_id, np.zeros(len(self.names), dtype=np.int64))
+            totals += counted[row]
+        self.session_totals += counted.sum(axis=0)
+
+    def tracks(self):
+        return [{"id": int(track_id), "center": center.tolist(), "counts": dict(zip(self.names, count.tolist()))}
+                for track_id, center, count in zip(self.ids, self.centers, self.state.count)]
+
+    def track_totals(self):
+        return {track_id: dict(zip(self.names, totals.tolist())) for track_id, totals in self.daily_totals.items()}
+
+    def counts(self):
+        return dict(zip(self.names, self.session_totals.tolist()))